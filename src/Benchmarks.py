@@ -0,0 +1,591 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for the AzureDataLakeAccess read, fill and QC functions using synthetic data so no
+datalake access or tower data is needed.
+
+Run from the src directory:
+    python Benchmarks.py                 # all benchmarks
+    python Benchmarks.py suite --days 1 30 365 1095 --save-baseline
+    python Benchmarks.py suite           # compares against the saved baseline
+
+benchmark_baseline.json holds the suite results (1, 30 and 365 days) of the code the suite was
+added with; save a new one on your own machine before comparing changes, as the times depend on it.
+"""
+import argparse
+import datetime
+import filecmp
+import functools
+import glob
+import json
+import pathlib
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import AzureDataLakeAccess as ADLA
+import DataLakeSchemas
+
+# QC settings for Grade_cs in the same layout as the access dictionary read from DataLakeDownload.xlsx
+QC_ACCESS = {
+    'Flux': {'grade': 5, 'LE_B': -100, 'H_B': -100, 'F_B': -50, 'ustar': 0, 'gg': 'H_qc_grade', 'cls': 'H'},
+    'Met': {'LE_B': 800, 'H_B': 800, 'F_B': 50, 'gg': 'LE_qc_grade', 'cls': 'LE'},
+    'Val_3': {'gg': 'Fc_qc_grade', 'cls': 'Fc_molar'}
+}
+
+# Suite results compared against by default, next to this file
+BASELINE_FILE = pathlib.Path(__file__).resolve().parent / 'benchmark_baseline.json'
+
+# Ranges (uniform) for the columns the QC looks at so the synthetic data goes through the QC checks like tower data; everything else is normal(10, 5)
+SYNTHETIC_RANGES = {
+    'amb_tmpr_Avg': (-10, 35), 'RH_Avg': (15, 102), 'amb_press_Avg': (91, 95), 'rslt_wnd_spd': (0, 12), 'wnd_dir_compass': (0, 360),
+    'Precipitation_Tot': (0, 0.2), 'PAR_density_Avg': (0, 2000), 'Rn_meas_Avg': (-100, 800), 'VPD_air': (0, 4), 'e_Avg': (0.3, 2.5),
+    'e_sat_Avg': (0.5, 5), 'e': (0.3, 2.5), 'e_sat': (0.5, 5), 'CO2_sig_strgth_Min': (0.6, 1), 'H2O_sig_strgth_Min': (0.6, 1),
+    'door_is_open_Hst': (0, 0), 'sonic_samples_Tot': (14000, 18000), 'Fc_samples_Tot': (14000, 18000),
+    'H_qc_grade': (1, 9), 'LE_qc_grade': (1, 9), 'Fc_qc_grade': (1, 9), 'H': (-50, 400), 'LE': (-20, 500), 'Fc_molar': (-30, 15)
+}
+
+def write_toa5(filepath, dataset_type, start, periods, frq, seed=0):
+    # Writes a synthetic logger file (TOA5, four header lines) using the columns from get_dtypes
+    df = synthetic_frame(dataset_type, start, periods, frq, seed)
+    columns = ['TIMESTAMP'] + list(df.columns)
+    with open(filepath, 'w', newline='') as f:
+        signature = dataset_type.split('_V')[1] if '_V' in dataset_type else '0' # Program signature of the logger program the schema is for
+        f.write('"TOA5","Synthetic","CR3000","0","CR3000.Std.32","CPU:synthetic.CR3","' + signature + '","' + dataset_type + '"\n')
+        f.write(','.join('"' + c + '"' for c in columns) + '\n')
+        f.write(','.join('""' for c in columns) + '\n')
+        f.write(','.join('""' for c in columns) + '\n')
+        df.to_csv(f, header=False, date_format='%Y-%m-%d %H:%M:%S')
+    return filepath
+
+def single_precision(x):
+    # Rounds to 4 decimals and to the values a logger can store (IEEE4, single precision)
+    return np.round(x, 4).astype(np.float32).astype(str).astype(float)
+
+def synthetic_frame(dataset_type, start, periods, frq, seed=0):
+    # Builds a frame with the columns and types from get_dtypes filled with random values
+    dtypes = ADLA.get_dtypes(dataset_type)
+    rng = np.random.default_rng(seed)
+    idx = pd.date_range(start, periods=periods, freq=frq)
+    data = {}
+    for name, dtype in dtypes.items():
+        if name == 'TIMESTAMP':
+            continue
+        if name == 'RECORD':
+            data[name] = np.arange(periods) + seed*periods
+        elif name in SYNTHETIC_RANGES:
+            lo, hi = SYNTHETIC_RANGES[name]
+            data[name] = rng.integers(lo, hi + 1, periods) if dtype == 'Int64' else single_precision(rng.uniform(lo, hi, periods))
+        elif dtype == 'Int64':
+            data[name] = rng.integers(0, 20000, periods)
+        elif (dtype is str) | (dtype is object):
+            data[name] = 'x'
+        else:
+            data[name] = single_precision(rng.normal(10, 5, periods))
+    df = pd.DataFrame(data, index=idx)
+    df.index.name = 'TIMESTAMP'
+    return df
+
+def datalake_filename(dataset_type, day):
+    # Logger file name with the date in the 4th-6th underscore separated fields like the files in the datalake
+    return f'Synthetic_Logger_{dataset_type.replace("_", "")}_{day:%Y_%m_%d}_0000.dat'
+
+def write_daily_files(directory, dataset_type, start, days, frq):
+    # Writes one synthetic logger file per day; mirrors the daily files downloaded from the datalake
+    periods = int(pd.Timedelta('1D')/pd.Timedelta(frq))
+    start = pd.Timestamp(start)
+    filenames = []
+    for d in range(0, days):
+        day = start + pd.Timedelta(days=d)
+        filepath = pathlib.Path(directory) / datalake_filename(dataset_type, day)
+        filenames.append(str(write_toa5(filepath, dataset_type, day, periods, frq, seed=d)))
+    return filenames
+
+def write_datalake(root, file_system, path, dataset_type, start, days, frq):
+    # Writes one synthetic logger file per day into a local directory laid out like the datalake ({root}/{file_system}/{path}{YYYY}/{MM}) for LocalStorage
+    periods = int(pd.Timedelta('1D')/pd.Timedelta(frq))
+    start = pd.Timestamp(start)
+    for d in range(0, days):
+        day = start + pd.Timedelta(days=d)
+        month_dir = pathlib.Path(root) / file_system / f'{path}{day:%Y}' / f'{day:%m}'
+        month_dir.mkdir(parents=True, exist_ok=True)
+        write_toa5(month_dir / datalake_filename(dataset_type, day), dataset_type, day, periods, frq, seed=d)
+
+def concat_loop_read(filenames, hdr, idxfll, specified_dtypes = None):
+    # Previous Fast_Read approach with a concat per file; kept only for comparison
+    Final = pd.DataFrame()
+    for f in filenames:
+        df = ADLA.read_file(f, hdr, specified_dtypes)
+        Final = pd.concat([Final, df], sort = False)
+    Out = ADLA.indx_fill(Final, idxfll)
+    Out.index = pd.to_datetime(Out.index)
+    return Out.sort_index()
+
+def sort_indx_fill(df_in, frq):
+    # Previous indx_fill with a full copy, a blank count of every row and two sorts; kept only for comparison
+    df = df_in.copy()
+    df.index = pd.to_datetime(df.index)
+    df['nan_count'] = pd.isna(df).sum(axis=1)
+    df = df.sort_values(['RECORD', 'nan_count'])
+    df = df[~df.index.duplicated(keep='first')]
+    df = df.drop('nan_count',axis=1).sort_index()
+    idx = pd.date_range(df.index[0].floor('D'),df.index[len(df.index)-1].ceil('D'),freq = frq)
+    return df.reindex(idx, fill_value=np.nan)
+
+def overlapping_files(dataset_type, days, frq, seed=0):
+    # Frame as read from daily files with overlapping endpoints (each file has the first hour of the next day), some days downloaded twice with columns left blank, a logger reset (RECORD restarts) and out of order files
+    periods = int(pd.Timedelta('1D')/pd.Timedelta(frq))
+    overlap = int(pd.Timedelta('1h')/pd.Timedelta(frq))
+    df = synthetic_frame(dataset_type, datetime.date(2022, 10, 1), days*periods + overlap, frq, seed)
+    rng = np.random.default_rng(seed)
+    files = [df.iloc[d*periods:(d + 1)*periods + overlap] for d in range(days)]
+    blanks = [c for c in df.columns if df[c].dtype.kind == 'f']
+    for d in rng.choice(days, max(days//10, 1), replace=False):
+        again = files[d].copy()
+        again[list(rng.choice(blanks, 5, replace=False))] = np.nan
+        files.append(again)
+    reset = files[rng.integers(days)].copy()
+    reset['RECORD'] = np.arange(len(reset))
+    files.append(reset)
+    return pd.concat([files[i] for i in rng.permutation(len(files))])
+
+def bench_fast_read_scaling(day_counts=(30, 90, 180, 365), dataset_type='FluxRaw', frq='30min'):
+    # Times Fast_Read for an increasing number of daily files; time per file should stay flat if reading scales linearly
+    print(f'Fast_Read scaling, {dataset_type}')
+    print(f'{"files":>6} {"Fast_Read (s)":>14} {"ms/file":>8} {"concat loop (s)":>16} {"ms/file":>8}')
+    with tempfile.TemporaryDirectory() as tmp:
+        filenames = write_daily_files(tmp, dataset_type, datetime.date(2022, 10, 1), max(day_counts), frq)
+        dtypes = ADLA.get_dtypes(dataset_type)
+        for n in day_counts:
+            t0 = time.perf_counter()
+            new = ADLA.Fast_Read(filenames[:n], 4, frq, dtypes)
+            t_new = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            old = concat_loop_read(filenames[:n], 4, frq, dtypes)
+            t_old = time.perf_counter() - t0
+            pd.testing.assert_frame_equal(new, old)
+            print(f'{n:>6} {t_new:>14.3f} {1000*t_new/n:>8.2f} {t_old:>16.3f} {1000*t_old/n:>8.2f}')
+
+def bench_indx_fill(day_counts=(1, 30, 365), schemas=(('FluxRaw_V40826', '30min'), ('MetRaw_V40826', '15min'))):
+    # Times indx_fill against the previous sorting version on frames read from overlapping, repeated and out of order files and checks the output is identical
+    print(f'indx_fill on overlapping files')
+    print(f'{"schema":<16} {"days":>5} {"rows":>7} {"indx_fill (s)":>14} {"previous (s)":>13}')
+    for dataset_type, frq in schemas:
+        for days in day_counts:
+            df = overlapping_files(dataset_type, days, frq)
+            new, t_new, _ = measure(ADLA.indx_fill, df, frq)
+            old, t_old, _ = measure(sort_indx_fill, df, frq)
+            pd.testing.assert_frame_equal(new, old)
+            print(f'{dataset_type:<16} {days:>5} {len(df):>7} {t_new:>14.3f} {t_old:>13.3f}')
+
+def bench_parallel_read(days=365, workers=(1, 2, 4), dataset_type='FluxRaw', frq='30min'):
+    # Times Fast_Read with a process pool against the serial read and checks the output is identical
+    print(f'Fast_Read workers, {dataset_type}, {days} files')
+    with tempfile.TemporaryDirectory() as tmp:
+        filenames = write_daily_files(tmp, dataset_type, datetime.date(2022, 10, 1), days, frq)
+        dtypes = ADLA.get_dtypes(dataset_type)
+        serial = None
+        for w in workers:
+            t0 = time.perf_counter()
+            df = ADLA.Fast_Read(filenames, 4, frq, dtypes, workers=w)
+            t = time.perf_counter() - t0
+            if serial is None:
+                serial = df
+            else:
+                pd.testing.assert_frame_equal(df, serial)
+            print(f'{w:>3} workers {t:>8.3f} s')
+
+def bench_aggregated_formats(days=365, dataset_type='FluxAggregated', col='Flux', frq='30min'):
+    # Times writing and reading back a water year aggregated file as csv and with the parquet copy
+    print(f'Aggregated file formats, {dataset_type}, {days} days')
+    periods = int(days*pd.Timedelta('1D')/pd.Timedelta(frq))
+    df = ADLA.indx_fill(synthetic_frame(dataset_type, datetime.date(2022, 10, 1), periods, frq), frq)
+    with tempfile.TemporaryDirectory() as tmp:
+        fpath = str(pathlib.Path(tmp) / 'Synthetic_AggregateQC_CY2023_V0_20230930.csv')
+        t0 = time.perf_counter()
+        ADLA.write_aggregated(df, fpath, col, 'csv')
+        t_write_csv = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        csv = ADLA.read_aggregated(fpath, col, frq)
+        t_read_csv = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        ADLA.write_aggregated(df, fpath, col, 'parquet')
+        t_write_pq = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        pq = ADLA.read_aggregated(fpath, col, frq)
+        t_read_pq = time.perf_counter() - t0
+        pd.testing.assert_frame_equal(csv, pq, check_dtype=False, check_index_type=False, check_freq=False)
+    print(f'csv      write {t_write_csv:>7.3f} s  read {t_read_csv:>7.3f} s')
+    print(f'parquet  write {t_write_pq:>7.3f} s  read {t_read_pq:>7.3f} s (write includes the csv)')
+
+def bench_projection(days=365, dataset_type='FluxAggregated', col='Flux', frq='30min'):
+    # Times reading a water year aggregated file with all the columns and with only the tower report columns (TowerReportPlots.variable_groups), as csv and with the parquet copy
+    import TowerReportPlots as TRP
+    columns = [var for vars_to_plot in TRP.variable_groups.values() for var in vars_to_plot]
+    print(f'Column projection, {dataset_type}, {days} days, {len(columns)} columns')
+    periods = int(days*pd.Timedelta('1D')/pd.Timedelta(frq))
+    df = ADLA.indx_fill(synthetic_frame(dataset_type, datetime.date(2022, 10, 1), periods, frq), frq)
+    with tempfile.TemporaryDirectory() as tmp:
+        fpath = str(pathlib.Path(tmp) / 'Synthetic_AggregateQC_CY2023_V0_20230930.csv')
+        for file_format in ('csv', 'parquet'):
+            ADLA.write_aggregated(df, fpath, col, file_format)
+            full, t_full, peak_full = measure(ADLA.read_aggregated, fpath, col, frq)
+            projected, t_projected, peak_projected = measure(ADLA.read_aggregated, fpath, col, frq, False, columns)
+            pd.testing.assert_frame_equal(projected, full[projected.columns])
+            print(f'{file_format:<8} all {t_full:>7.3f} s {peak_full:>7.1f} MB   projected {t_projected:>7.3f} s {peak_projected:>7.1f} MB')
+
+def bench_time_range(day_counts=(30, 180, 365), last_days=10, dataset_type='FluxAggregated', col='Flux', frq='30min'):
+    # Times reading the last days of aggregated files of growing length (like the weekly tower report) with the whole file read and sliced and with the time range pushed down to the reader
+    print(f'Time range reads, {dataset_type}, last {last_days} days')
+    with tempfile.TemporaryDirectory() as tmp:
+        for days in day_counts:
+            periods = int(days*pd.Timedelta('1D')/pd.Timedelta(frq))
+            df = ADLA.indx_fill(synthetic_frame(dataset_type, datetime.date(2022, 10, 1), periods, frq), frq)
+            fpath = str(pathlib.Path(tmp) / f'Synthetic_AggregateQC_CY2023_V0_{days}.csv')
+            for file_format in ('csv', 'parquet'):
+                ADLA.write_aggregated(df, fpath, col, file_format)
+                end = ADLA.get_last_timestamp(fpath)
+                start = end - datetime.timedelta(days=last_days)
+                t0 = time.perf_counter()
+                full = ADLA.read_aggregated(fpath, col, frq)[start:end]
+                t_full = time.perf_counter() - t0
+                t0 = time.perf_counter()
+                window = ADLA.read_aggregated(fpath, col, frq, start=start, end=end)
+                t_window = time.perf_counter() - t0
+                pd.testing.assert_frame_equal(window, full, check_freq=False)
+                print(f'{days:>4} days {file_format:<8} read and slice {t_full:>7.3f} s   time range {t_window:>7.3f} s')
+
+def bench_incremental_update(days=365, new_days=1, col='Flux', dataset_type='FluxRaw_V40826', frq='30min'):
+    # Times adding new daily files to a QCed aggregated file with a full re-process and with the incremental mode; the two files written must be identical
+    print(f'Incremental update, {dataset_type}, {new_days} new day(s) on {days} days')
+    with tempfile.TemporaryDirectory() as tmp:
+        filenames = write_daily_files(tmp, dataset_type, datetime.date(2022, 10, 1), days + new_days, frq)
+        dtypes = ADLA.get_dtypes(dataset_type)
+        aggregated_file = str(pathlib.Path(tmp) / 'aggregated.csv')
+        CE, _ = ADLA.merge_new_data(None, ADLA.Fast_Read(filenames[:days-1], 4, frq, dtypes), col, frq, QC_ACCESS, True)
+        CE.to_csv(aggregated_file, index_label = 'TIMESTAMP')
+        # Previous run adding the last day so the file is in the form a daily run would have left it
+        CE, _ = ADLA.merge_new_data(ADLA.Fast_Read([aggregated_file], 1, frq), ADLA.Fast_Read(filenames[days-2:days], 4, frq, dtypes), col, frq, QC_ACCESS, True)
+        CE.to_csv(aggregated_file, index_label = 'TIMESTAMP')
+        CE = ADLA.Fast_Read([aggregated_file], 1, frq)
+        CEN = ADLA.Fast_Read(filenames[days-1:], 4, frq, dtypes) # Downloads start a day before the last data in the file
+        full_file = str(pathlib.Path(tmp) / 'full.csv')
+        t0 = time.perf_counter()
+        full, _ = ADLA.merge_new_data(CE, CEN, col, frq, QC_ACCESS, True, False)
+        ADLA.write_aggregated(full, full_file, col)
+        t_full = time.perf_counter() - t0
+        incremental_file = str(pathlib.Path(tmp) / 'incremental.csv')
+        t0 = time.perf_counter()
+        incremental, tail_start = ADLA.merge_new_data(CE, CEN, col, frq, QC_ACCESS, True, True)
+        ADLA.append_aggregated(incremental[incremental.index >= tail_start], aggregated_file, incremental_file)
+        t_incremental = time.perf_counter() - t0
+        if not filecmp.cmp(full_file, incremental_file, shallow=False):
+            raise Exception('Incremental update does not match the full re-process')
+    print(f'full        {t_full:>7.3f} s')
+    print(f'incremental {t_incremental:>7.3f} s')
+
+def bench_access_azure(days=60, latency=0.05, download_concurrency=(1, 8), col='Flux', frq='30min'):
+    # Runs AccessAzure end to end (download, read, fill, save, upload) against a LocalStorage datalake with latency added to every call
+    # Also runs it with explicit dates and incremental=True, which has no previous file to add to, and checks it writes the same file
+    print(f'AccessAzure end to end, {col}, {days} days, {latency} s latency')
+    with tempfile.TemporaryDirectory() as tmp:
+        root = pathlib.Path(tmp)
+        start = datetime.date(2022, 10, 1)
+        end = start + datetime.timedelta(days=days-1)
+        write_datalake(root / 'lake', 'raw', f'Synthetic/{col}/', f'{col}Raw', start, days, frq)
+        access = {col: {'Ver': 'V0', 'LOCAL_DIRECT': np.nan, 'path': f'Synthetic/{col}/', 'file_system': 'raw', 'back': 0, 'UPLOAD': 'upload/',
+            'inputPath': str(root / 'input'), 'workingPath': str(root / 'working'), 'outputPath': str(root / 'output')}}
+        CEF = str(root / 'output' / 'Synthetic' / col / f'Synthetic_{col}_AggregateQC_CY*_V0*.csv')
+        storage = ADLA.LocalStorage(root / 'lake', latency)
+        for c in download_concurrency:
+            t0 = time.perf_counter()
+            df = ADLA.AccessAzure('Synthetic', col, frq, access, CEF, QC=False, startDate=str(start), endDate=str(end), download_concurrency=c, storage=storage)
+            t = time.perf_counter() - t0
+            print(f'download concurrency {c:>3}: {t:>7.3f} s, {len(df)/t:>9.0f} rows/s')
+        # Explicit dates with incremental: no previous file is read so the run is a full one and must write the same file
+        fpath = glob.glob(CEF)[0]
+        full = pathlib.Path(fpath).read_bytes()
+        ADLA.AccessAzure('Synthetic', col, frq, access, CEF, QC=False, startDate=str(start), endDate=str(end), storage=storage, incremental=True)
+        if pathlib.Path(fpath).read_bytes() != full:
+            raise Exception('Incremental run with explicit dates does not match the full run')
+        print('incremental with explicit dates matches the full run')
+
+def bench_compact(days=365, col='Flux', dataset_type='FluxRaw_V40826', frq='30min'):
+    # Compares the memory of the aggregated frame read with the default and the compact types; the QCed files written from both must be identical
+    print(f'Compact types, {dataset_type}, {days} days')
+    with tempfile.TemporaryDirectory() as tmp:
+        filenames = write_daily_files(tmp, dataset_type, datetime.date(2022, 10, 1), days, frq)
+        sizes = {}
+        for compact in (False, True):
+            aggregated_file = str(pathlib.Path(tmp) / f'aggregated_{compact}.csv')
+            CE, _ = ADLA.merge_new_data(None, ADLA.Fast_Read(filenames, 4, frq, ADLA.get_dtypes(dataset_type, compact)), col, frq, QC_ACCESS, True)
+            if compact:
+                CE = ADLA.compact_frame(CE, f'{col}Aggregated')
+            ADLA.write_aggregated(CE, aggregated_file, col)
+            t0 = time.perf_counter()
+            df = ADLA.read_aggregated(aggregated_file, col, frq, compact)
+            t = time.perf_counter() - t0
+            sizes[compact] = df.memory_usage(deep=True).sum()/1024**2
+            print(f'compact {str(compact):<5}: read {t:>7.3f} s, {sizes[compact]:>8.1f} MB')
+        if not filecmp.cmp(str(pathlib.Path(tmp) / 'aggregated_False.csv'), str(pathlib.Path(tmp) / 'aggregated_True.csv'), shallow=False):
+            raise Exception('Compact types change the aggregated file')
+    print(f'compact frame is {sizes[True]/sizes[False]:.2f} of the default')
+
+def bench_schema_detection(days=30, col='Flux', dataset_types=('FluxRaw', 'FluxRaw_V40826'), frq='30min'):
+    # Reads a batch of logger files from alternating program versions in one pass with the schema picked from each file header; checks no file is skipped and each column has its schema type
+    print(f'Schema detection, {" and ".join(dataset_types)}, {days} days')
+    DataLakeSchemas.schemas.clear()
+    t0 = time.perf_counter()
+    ADLA.get_dtypes(dataset_types[0])
+    t_load = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    ADLA.get_dtypes(dataset_types[0])
+    t_cached = time.perf_counter() - t0
+    print(f'schema load {t_load*1000:>8.3f} ms, cached {t_cached*1000:>8.3f} ms')
+    with tempfile.TemporaryDirectory() as tmp:
+        start = datetime.date(2022, 10, 1)
+        filenames = []
+        for d in range(days):
+            day = start + datetime.timedelta(days=d)
+            dataset_type = dataset_types[d % len(dataset_types)]
+            filenames.append(write_toa5(pathlib.Path(tmp) / datalake_filename(dataset_type, day), dataset_type, day, int(pd.Timedelta('1D')/pd.Timedelta(frq)), frq, d))
+        for dataset_type in dataset_types:
+            t0 = time.perf_counter()
+            df = ADLA.read_files(filenames, 4, ADLA.get_dtypes(dataset_type))
+            print(f'fixed {dataset_type:<16}: {time.perf_counter() - t0:>7.3f} s, {len(df):>6} rows, {(df.dtypes == "Int64").sum():>3} Int64 columns')
+        t0 = time.perf_counter()
+        df = ADLA.read_files(filenames, 4, functools.partial(ADLA.detect_dtypes, col=col))
+        print(f'detected {"":<13}: {time.perf_counter() - t0:>7.3f} s, {len(df):>6} rows, {(df.dtypes == "Int64").sum():>3} Int64 columns')
+    if len(df) != days*int(pd.Timedelta('1D')/pd.Timedelta(frq)):
+        raise Exception('Files were skipped with the detected schemas')
+    for dataset_type in dataset_types:
+        for c, t in ADLA.get_dtypes(dataset_type).items():
+            if (c in df.columns) and (t == 'Int64') and (df[c].dtype != 'Int64'):
+                raise Exception(f'{c} was not read as {t}')
+
+def bench_report_rendering(day_counts=(10, 365), dataset_type='FluxAggregated', frq='30min'):
+    # Times writing the tower report pages (TowerReportPlots.write_report) for two stations over windows of growing length, with every point plotted and downsampled
+    import TowerReportPlots as TRP
+    print(f'Tower report rendering, {dataset_type}')
+    columns = [var for vars_to_plot in TRP.variable_groups.values() for var in vars_to_plot]
+    with tempfile.TemporaryDirectory() as tmp:
+        for days in day_counts:
+            periods = int(days*pd.Timedelta('1D')/pd.Timedelta(frq))
+            data_frames = {station: ADLA.indx_fill(synthetic_frame(dataset_type, datetime.date(2022, 10, 1), periods, frq, seed), frq)[columns]
+                for seed, station in enumerate(['CookEast', 'CookWest'])}
+            for max_points in sorted({2*periods, min(2*periods, 2000)}, reverse=True): # Every point, then downsampled if the window has more than 2000 points
+                fpath = pathlib.Path(tmp) / f'report_{days}_{max_points}.pdf'
+                t0 = time.perf_counter()
+                TRP.write_report(str(fpath), data_frames, max_points)
+                t = time.perf_counter() - t0
+                print(f'{days:>4} days, {"all" if max_points == 2*periods else max_points:>5} points/line: {t:>7.3f} s, {fpath.stat().st_size/1024**2:>6.2f} MB')
+
+def bench_config(sites=('CookEast', 'CookWest', 'BoydNorth', 'BoydSouth'), tables=('Flux', 'Met')):
+    # Times reading the config template (DataLakeDownload_TEMPLATE.xlsx) once per site and table (previous driver) against load_config parsing it once and then from the cache; checks all give the same settings
+    import shutil
+    import subprocess
+    import sys
+    template = pathlib.Path(__file__).resolve().parent.parent / 'DataLakeDownload_TEMPLATE.xlsx'
+    print(f'Config, {len(sites)} sites x {len(tables)} tables')
+    with tempfile.TemporaryDirectory() as tmp:
+        configPath = pathlib.Path(tmp) / 'DataLakeDownload.xlsx'
+        shutil.copy(template, configPath)
+        t0 = time.perf_counter()
+        previous = {site: pd.read_excel(configPath, sheet_name = site, index_col = 'Variable').to_dict() for table in tables for site in sites}
+        t_previous = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        ADLA.load_config(configPath)
+        t_first = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        config = ADLA.load_config(configPath)
+        t_cached = time.perf_counter() - t0
+        for site in sites:
+            pd.testing.assert_frame_equal(pd.DataFrame(config[site]), pd.DataFrame(previous[site]), check_dtype=False)
+        # Fresh process so openpyxl is not already imported
+        code = f'import sys, AzureDataLakeAccess as ADLA; ADLA.load_config({str(configPath)!r}); print("openpyxl" in sys.modules)'
+        imported = subprocess.run([sys.executable, '-c', code], cwd=pathlib.Path(__file__).resolve().parent, capture_output=True, text=True).stdout.strip()
+        if imported != 'False':
+            raise Exception(f'openpyxl imported with the cached config: {imported}')
+    print(f'read_excel per job {t_previous*1000:>8.1f} ms')
+    print(f'load_config first  {t_first*1000:>8.1f} ms')
+    print(f'load_config cached {t_cached*1000:>8.1f} ms')
+
+def bench_import_time(modules=('DataLakeQC', 'DataLakeSchemas', 'DataLakeIO', 'AzureDataLakeAccess', 'TowerReportPlots'), repeats=3):
+    # Times importing each module in a fresh process (best of repeats) and lists which of matplotlib and the azure SDK it loaded; the library modules must not load either
+    import subprocess
+    import sys
+    print(f'Import time, best of {repeats}')
+    print(f'{"module":<20} {"ms":>8} {"matplotlib":>11} {"azure":>6}')
+    code = ('import sys, time; t0 = time.perf_counter(); import {}; t = time.perf_counter() - t0; '
+        'print(t, "matplotlib" in sys.modules, any(m.split(".")[0] == "azure" for m in sys.modules))')
+    for module in ('pandas',) + tuple(modules):
+        runs = []
+        for _ in range(repeats):
+            out = subprocess.run([sys.executable, '-c', code.format(module)], cwd=pathlib.Path(__file__).resolve().parent, capture_output=True, text=True, check=True).stdout.split()
+            runs.append(out)
+        t, matplotlib, azure = min(runs, key=lambda r: float(r[0]))
+        print(f'{module:<20} {float(t)*1000:>8.0f} {matplotlib:>11} {azure:>6}')
+        if (module != 'pandas') and ((matplotlib == 'True') or (azure == 'True')):
+            raise Exception(f'Importing {module} loads matplotlib or the azure SDK')
+
+class InterruptedStorage(ADLA.LocalStorage):
+    # LocalStorage whose downloads fail after limit bytes of each file, like a dropped connection
+    def __init__(self, root, limit):
+        super().__init__(root)
+        self.limit = limit
+
+    def download_to(self, file_system, path, f, offset=0, etag=None, chunk_size=4*1024*1024):
+        limit = self.limit
+        class Dropped:
+            def write(self, chunk):
+                nonlocal limit
+                f.write(chunk[:limit])
+                limit -= len(chunk)
+                if limit < 0:
+                    raise ConnectionError(f'{path}: connection dropped')
+        return super().download_to(file_system, path, Dropped(), offset, etag, chunk_size)
+
+def bench_resumable_download(days=60, col='Flux', frq='30min'):
+    # Downloads a month or two of logger files with every transfer dropped part way, then again; the second run only transfers the missing bytes
+    # Also checks a truncated file left by an old run is downloaded again and a corrupt part fails the MD5 check and is downloaded in full by the next run
+    print(f'Resumable downloads, {days} files')
+    with tempfile.TemporaryDirectory() as tmp:
+        root = pathlib.Path(tmp)
+        start = datetime.date(2022, 10, 1)
+        end = start + datetime.timedelta(days=days-1)
+        write_datalake(root / 'lake', 'raw', f'Synthetic/{col}/', f'{col}Raw', start, days, frq)
+        access = {col: {'LOCAL_DIRECT': np.nan, 'path': f'Synthetic/{col}/', 'file_system': 'raw', 'back': 0, 'inputPath': str(root / 'input')}}
+        local = root / 'input' / 'Synthetic' / col
+        sources = sorted((root / 'lake' / 'raw').rglob('*.dat'))
+        total = sum(f.stat().st_size for f in sources)
+
+        def download(storage):
+            metrics = ADLA.RunMetrics()
+            t0 = time.perf_counter()
+            ADLA.download_data_from_datalake(access, start, col, 'Synthetic', end, 8, storage=storage, metrics=metrics)
+            return time.perf_counter() - t0, metrics.counters
+
+        t_full, counters = download(ADLA.LocalStorage(root / 'lake'))
+        print(f'full download  {t_full:>7.3f} s, {counters.get("bytes_downloaded", 0):>10} bytes')
+        for f in local.iterdir():
+            f.unlink()
+
+        _, counters = download(InterruptedStorage(root / 'lake', sources[0].stat().st_size // 2))
+        if list(local.glob('*.dat')) or counters.get('files_downloaded'):
+            raise Exception('Interrupted downloads left files behind')
+        (local / sources[0].name).write_bytes(sources[0].read_bytes()[:100]) # Truncated file from an old run
+        (local / next(local.glob(glob.escape(sources[0].name) + '.*.part')).name).unlink()
+        partial = sum(f.stat().st_size for f in local.glob('*.part'))
+        t_resume, counters = download(ADLA.LocalStorage(root / 'lake'))
+        print(f'resumed        {t_resume:>7.3f} s, {counters.get("bytes_downloaded", 0):>10} bytes ({counters.get("files_resumed", 0)} files resumed, {total - partial} bytes missing)')
+        if counters.get('bytes_downloaded', 0) != total - partial:
+            raise Exception('Resumed downloads transferred more than the missing bytes')
+        for f in sources:
+            if not filecmp.cmp(f, local / f.name, shallow=False):
+                raise Exception(f'{f.name} does not match the datalake')
+
+        # Corrupt part (right name, wrong bytes): fails the MD5 check, is deleted and downloaded in full by the next run
+        (local / sources[1].name).unlink()
+        etag = ADLA.LocalStorage(root / 'lake').etag(sources[1].stat())
+        (local / f'{sources[1].name}.{"".join(c for c in etag if c.isalnum())}.part').write_bytes(b'x' * 1000)
+        _, counters = download(ADLA.LocalStorage(root / 'lake'))
+        if (local / sources[1].name).exists() or list(local.glob('*.part')):
+            raise Exception('Corrupt part was not caught by the MD5 check')
+        _, counters = download(ADLA.LocalStorage(root / 'lake'))
+        if not filecmp.cmp(sources[1], local / sources[1].name, shallow=False):
+            raise Exception('Corrupt part was not downloaded again')
+    print('truncated file downloaded again, corrupt part caught by the MD5 check')
+
+# Schemas run through the suite: (dataset type, table, time step)
+SUITE_SCHEMAS = [('FluxRaw_V40826', 'Flux', '30min'), ('MetRaw_V40826', 'Met', '15min'), ('FluxRaw', 'Flux', '30min'), ('MetRaw', 'Met', '15min')]
+
+def measure(func, *args):
+    # Runs func twice: once for the wall time and once under tracemalloc for the peak memory (tracing slows pandas down a lot so it can't be timed at the same time)
+    # Returns the result, wall time in seconds and peak traced memory in MB
+    t0 = time.perf_counter()
+    result = func(*args)
+    seconds = time.perf_counter() - t0
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]/1024**2
+    tracemalloc.stop()
+    return result, seconds, peak
+
+def bench_suite(day_counts=(1, 30, 365), schemas=SUITE_SCHEMAS):
+    # Times each stage of the read, fill and QC path for each schema and data size; returns a list of results (one per schema, size and stage)
+    results = []
+    print(f'{"schema":<16} {"days":>5} {"stage":<16} {"seconds":>8} {"rows/s":>10} {"peak MB":>8}')
+    for dataset_type, col, frq in schemas:
+        for days in day_counts:
+            with tempfile.TemporaryDirectory() as tmp:
+                filenames = write_daily_files(tmp, dataset_type, datetime.date(2022, 10, 1), days, frq)
+                dtypes = ADLA.get_dtypes(dataset_type)
+                stages = []
+                raw, t, peak = measure(ADLA.read_files, filenames, 4, dtypes)
+                stages.append(('read raw', len(raw), t, peak))
+                df, t, peak = measure(ADLA.indx_fill, raw, frq)
+                stages.append(('indx_fill', len(df), t, peak))
+                if dataset_type.endswith('_V40826'): # QC uses the column names of the V40826 logger program
+                    if col == 'Flux':
+                        df, t, peak = measure(ADLA.Grade_cs, df, QC_ACCESS)
+                        stages.append(('Grade_cs', len(df), t, peak))
+                    df, t, peak = measure(ADLA.METQC, df, col)
+                    stages.append(('METQC', len(df), t, peak))
+                aggregated_file = str(pathlib.Path(tmp) / 'aggregated.csv')
+                _, t, peak = measure(ADLA.write_aggregated, df, aggregated_file, col)
+                stages.append(('write aggregated', len(df), t, peak))
+                df, t, peak = measure(ADLA.Fast_Read, [aggregated_file], 1, frq)
+                stages.append(('read aggregated', len(df), t, peak))
+            for stage, rows, t, peak in stages:
+                results.append({'schema': dataset_type, 'days': days, 'stage': stage, 'seconds': t, 'rows': rows, 'peak_mb': peak})
+                print(f'{dataset_type:<16} {days:>5} {stage:<16} {t:>8.3f} {rows/t:>10.0f} {peak:>8.1f}')
+    return results
+
+def compare_to_baseline(results, baseline):
+    # Prints the time and memory of each result relative to the matching baseline result (ratio > 1 is slower/bigger)
+    previous = {(r['schema'], r['days'], r['stage']): r for r in baseline}
+    print(f'{"schema":<16} {"days":>5} {"stage":<16} {"time x":>7} {"memory x":>9}')
+    for r in results:
+        b = previous.get((r['schema'], r['days'], r['stage']))
+        if b is None:
+            continue
+        print(f'{r["schema"]:<16} {r["days"]:>5} {r["stage"]:<16} {r["seconds"]/b["seconds"]:>7.2f} {r["peak_mb"]/max(b["peak_mb"], 1e-9):>9.2f}')
+
+BENCHMARKS = {
+    'scaling': bench_fast_read_scaling,
+    'indx_fill': bench_indx_fill,
+    'parallel': bench_parallel_read,
+    'formats': bench_aggregated_formats,
+    'projection': bench_projection,
+    'time_range': bench_time_range,
+    'incremental': bench_incremental_update,
+    'end_to_end': bench_access_azure,
+    'resumable_download': bench_resumable_download,
+    'compact': bench_compact,
+    'schemas': bench_schema_detection,
+    'report': bench_report_rendering,
+    'config': bench_config,
+    'import_time': bench_import_time,
+}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks for AzureDataLakeAccess using synthetic data')
+    parser.add_argument('benchmarks', nargs='*', choices=['suite'] + list(BENCHMARKS), help='benchmarks to run; all when none are given')
+    parser.add_argument('--days', type=int, nargs='+', default=[1, 30, 365], help='data sizes in days for the suite')
+    parser.add_argument('--baseline', default=str(BASELINE_FILE), help='baseline results file for the suite')
+    parser.add_argument('--save-baseline', action='store_true', help='save the suite results as the new baseline')
+    args = parser.parse_args()
+    selected = args.benchmarks or (['suite'] + list(BENCHMARKS))
+    for name in selected:
+        if name != 'suite':
+            BENCHMARKS[name]()
+            continue
+        results = bench_suite(args.days)
+        baseline = pathlib.Path(args.baseline)
+        if args.save_baseline:
+            baseline.write_text(json.dumps(results, indent=1))
+            print(f'Saved baseline to {baseline}')
+        elif baseline.is_file():
+            compare_to_baseline(results, json.loads(baseline.read_text()))
@@ -0,0 +1,761 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Eric Russell, Assistant Research Professor, CEE WSU
+@author: Bryan Carlson, Ecoinformaticist, USDA-ARS
+contact: eric.s.russell@wsu.edu
+Reading and writing the logger and aggregated files, the datalake storage (download/upload) and the access settings (config)
+Part of the AzureDataLakeAccess library (which brings in the names in __all__); see the readme within this repo for more details about the different scripts used
+"""
+import pathlib
+import pandas as pd
+import numpy as np
+import os
+import glob
+import datetime
+import threading
+
+from DataLakeQC import float64_values
+from DataLakeSchemas import get_dtypes, detect_aggregated_type, compact_frame
+
+# Names brought into AzureDataLakeAccess; the rest are helpers for these (e.g. the csv row search and the client cache)
+__all__ = ['CONFIG_TYPES', 'indx_fill', 'read_file', 'read_files', 'Fast_Read', 'get_service_client', 'check_config', 'load_config',
+           'AzureStorage', 'LocalStorage', 'download_file', 'open_manifest', 'mark_processed', 'download_data_from_datalake', 'Data_Update_Azure',
+           'wateryear', 'get_latest_file', 'read_aggregated', 'write_columnar', 'write_aggregated', 'append_aggregated', 'get_last_timestamp',
+           'get_latest_date_from_file', 'get_last_date_of_wateryear', 'get_first_date_of_wateryear', 'AggregatedUploadAzure']
+
+# Datalake clients built so far, keyed by account, tenant, client id and a hash of the secret; see get_service_client
+service_clients = {}
+service_clients_lock = threading.Lock()
+
+# Settings each data table (the columns with a Ver, e.g. Flux and Met) needs in the site sheets of DataLakeDownload.xlsx and their types; see load_config
+CONFIG_TYPES = {'storageaccountname': str, 'path': str, 'file_system': str, 'back': int, 'UPLOAD': str, 'Ver': str}
+
+def indx_fill(df_in, frq):   
+    # Fills in missing index values for a continuous time series. Rows are left blank.
+    # Duplicated times (e.g., files from mixed sources with overlapping endpoints) keep the row with the lowest RECORD, then the one with more data, then the first one in df_in
+    # Rows can come in any order; each is put straight into its place in the filled index so the frame is copied once and never sorted
+    index = pd.to_datetime(df_in.index)
+
+    # Remove any duplicated rows; only the rows with a duplicated time are compared
+    keep = np.ones(len(index), dtype=bool)
+    duplicated = index.duplicated(keep=False)
+    if duplicated.any():
+        rows = np.flatnonzero(duplicated)
+        dup = df_in.iloc[rows]
+        rows = rows[np.lexsort((pd.isna(dup).sum(axis=1).to_numpy(), dup['RECORD'].astype(float).to_numpy(), index[rows].asi8))] # Sorted by time, RECORD, then number of blanks; ties stay in order
+        keep[rows] = False
+        keep[rows[~index[rows].duplicated(keep='first')]] = True
+    kept = np.flatnonzero(keep)
+
+    # Fill in missing times due to tower being down and pad dataframe to midnight of the first and last day
+    idx = pd.date_range(index.min().floor('D'), index.max().ceil('D'), freq = frq)
+    # Row of df_in for each time in the new index; -1 (left blank) where there is none. Times off the new index are dropped
+    found = idx.get_indexer(index[kept])
+    indexer = np.full(len(idx), -1)
+    indexer[found[found >= 0]] = kept[found >= 0]
+    if np.array_equal(indexer, np.arange(len(df_in))): # Already continuous, in order and without duplicates
+        return df_in.set_axis(idx)
+    # Reindex by row number (no lookup of the times) with the missing rows filled with NaN/blanks
+    return df_in.set_axis(pd.RangeIndex(len(df_in))).reindex(indexer).set_axis(idx)
+
+def projection(columns):
+    # Column filter for read_csv (usecols) from the columns wanted; TIMESTAMP (index) and RECORD (used by indx_fill to drop duplicates) are always read. Columns not in the file are ignored.
+    if columns is None:
+        return None
+    keep = set(columns) | {'TIMESTAMP', 'RECORD'}
+    return lambda c: c in keep
+
+def find_row(f, key, lo, hi, after = False):
+    # Byte offset of the first line between the line starts lo and hi whose timestamp is at or after key (after key when after = True); bisects on the timestamps at the start of the lines, which are in time order
+    while lo < hi:
+        mid = (lo + hi)//2
+        f.seek(mid)
+        if mid > lo:
+            f.readline() # Move to the start of the next line
+        pos = f.tell() if mid > lo else lo
+        if pos >= hi: # No line starts between mid and hi; check the line at lo
+            pos = lo
+            f.seek(lo)
+        ts = f.readline().lstrip(b'"')[:len(key)]
+        if (ts > key) | ((ts == key) & (not after)):
+            hi = pos
+        else:
+            lo = f.tell()
+    return lo
+
+def read_time_range(filename, start = None, end = None):
+    # Header line and the rows from start to end (both included) of an aggregated csv as bytes; the rows are found by bisecting the file so only the lines in the range are read
+    with open(filename, 'rb') as f:
+        header = f.readline()
+        first = f.tell()
+        size = f.seek(0, os.SEEK_END)
+        lo = find_row(f, pd.Timestamp(start).strftime('%Y-%m-%d %H:%M:%S').encode(), first, size) if start is not None else first
+        hi = find_row(f, pd.Timestamp(end).strftime('%Y-%m-%d %H:%M:%S').encode(), lo, size, True) if end is not None else size
+        f.seek(lo)
+        return header + f.read(hi - lo)
+
+def read_file(filename, hdr, specified_dtypes = None, columns = None, start = None, end = None):
+    # Reads a single file; hdr == 4 is for data direct from the data logger (four header lines), hdr == 1 is for files with one header line that have been through some processing
+    # specified_dtypes: column types for read_csv, or a function that gives the types for a filename (e.g., detect_dtypes to use the schema of the logger program that wrote the file)
+    # columns: only these columns (plus TIMESTAMP and RECORD) are parsed; None reads them all
+    # start/end: only the rows in this time range (both included) are read from aggregated files (hdr == 1, csv or parquet); rows outside it are skipped before parsing
+    usecols = projection(columns)
+    if str(filename).endswith('.parquet'): # Columnar copy of an aggregated file; column types are stored in the file
+        import pyarrow.parquet as pq
+        names = pq.read_schema(filename).names
+        index = 'TIMESTAMP' if 'TIMESTAMP' in names else '__index_level_0__' # Index is stored without a name when it came from indx_fill
+        filters = [(index, '>=', pd.Timestamp(start))] if start is not None else []
+        filters += [(index, '<=', pd.Timestamp(end))] if end is not None else []
+        return pd.read_parquet(filename, columns=[c for c in names if usecols(c)] if usecols else None, filters=filters or None) # Row groups outside the time range are skipped
+    if callable(specified_dtypes):
+        specified_dtypes = specified_dtypes(filename)
+    if (hdr == 1) & ((start is not None) | (end is not None)):
+        import io
+        filename = io.BytesIO(read_time_range(filename, start, end))
+    if hdr == 4:
+        if specified_dtypes:
+            return pd.read_csv(filename,index_col = 'TIMESTAMP',header= 1,skiprows=[2,3],na_values='NAN',dtype=specified_dtypes,usecols=usecols)
+        return pd.read_csv(filename,index_col = 'TIMESTAMP',header= 1,skiprows=[2,3],na_values='NAN',low_memory=False,usecols=usecols)
+    if specified_dtypes:
+        return pd.read_csv(filename,index_col = 'TIMESTAMP',header= 0,dtype=specified_dtypes,usecols=usecols)
+    return pd.read_csv(filename,index_col = 'TIMESTAMP',header= 0,low_memory=False,usecols=usecols)
+
+def try_read_file(filename, hdr, specified_dtypes = None, columns = None, start = None, end = None):
+    # Same as read_file but returns None for logger files that cannot be parsed (e.g., types that do not match the program version) so they are skipped
+    if hdr == 4:
+        try:
+            return read_file(filename, hdr, specified_dtypes, columns, start, end)
+        except Exception as e:
+            print(f'Skipping {filename}: {e}')
+            return None
+    return read_file(filename, hdr, specified_dtypes, columns, start, end)
+
+def read_files(filenames, hdr, specified_dtypes = None, workers = 1, columns = None, start = None, end = None):
+    # Reads all the files and combines them with a single concat; concatenating inside the loop copies everything read so far for every file
+    # workers > 1 parses the files in a process pool; results come back in the same order as filenames so the output matches the serial read
+    if (workers > 1) & (len(filenames) > 1):
+        from concurrent.futures import ProcessPoolExecutor
+        import functools
+        chunksize = max(1, len(filenames)//(workers*4)) # Send a few files per task to cut down on the process communication
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            frames = list(pool.map(functools.partial(try_read_file, hdr=hdr, specified_dtypes=specified_dtypes, columns=columns, start=start, end=end), filenames, chunksize=chunksize))
+    else:
+        frames = [try_read_file(f, hdr, specified_dtypes, columns, start, end) for f in filenames]
+    frames = [df for df in frames if df is not None]
+    if len(frames) == 0:
+        return pd.DataFrame()
+    return pd.concat(frames, sort = False)
+
+def Fast_Read(filenames, hdr, idxfll, specified_dtypes = None, workers = 1, columns = None, start = None, end = None):
+    # workers: number of processes used to parse the files; 1 reads them one at a time
+    # columns: only read these columns (plus TIMESTAMP and RECORD); the others are never parsed. None reads them all
+    # start/end: only return the rows in this time range (both included); aggregated files (hdr == 1) skip the other rows before parsing
+    #Check to make sure there are files within the directory and doesn't error
+    if len(filenames) == 0:
+        print('No Files in directory, check the path name.')
+        return  # 'exit' function and return error
+    elif (hdr == 4) | (hdr == 1): # hdr == 4 is for data direct from the data logger as there are four header lines; hdr == 1 means there is only one header line and has been through some amount of processing
+        Final = read_files(filenames, hdr, specified_dtypes, workers, columns, start, end)
+        if Final.empty: # Nothing read (e.g., no rows in the time range)
+            return Final
+        # Fill missing index with blank values; also puts the rows in chronological order (files are not always read in order depending on how they are named)
+        Out = indx_fill(Final, idxfll)
+        if (start is not None) | (end is not None): # indx_fill pads to whole days; drop the padding outside the range
+            Out = Out.loc[start:end]
+    return Out # Return dataframe to main function.    
+
+def get_service_client(access, col):
+    # Returns the DataLakeServiceClient for the account in access, building it (and its credential) only the first time it is asked for.
+    # Clients are thread safe and keep their own connection pool and token cache, so sharing one between sites, tables, downloads and uploads skips repeat token requests and connection setup.
+    from azure.storage.filedatalake import DataLakeServiceClient
+    from azure.identity import ClientSecretCredential
+    import hashlib
+    storage_account_name =  access[col]['storageaccountname']
+    tenant_id = access[col]['TENANTID']
+    client_id =  access[col]['CLIENTID']
+    client_secret = access[col]['CLIENTSECRET']
+    key = (storage_account_name, tenant_id, client_id, hashlib.sha256(str(client_secret).encode()).hexdigest()) # A new secret in the config (rotated) gets a new client instead of the one with the old secret
+    with service_clients_lock:
+        if key not in service_clients:
+            # Credential to the client and build the token
+            credential = ClientSecretCredential(tenant_id,client_id, client_secret)
+            service_clients[key] = DataLakeServiceClient(account_url="{}://{}.dfs.core.windows.net".format(
+                "https", storage_account_name), credential=credential)
+        return service_clients[key]
+
+def check_config(sheet, access):
+    # Checks each data table in a site sheet (columns with a Ver) has the settings in CONFIG_TYPES and casts them to those types; other columns (e.g., extra QC settings) are left as they are
+    for table, settings in access.items():
+        if pd.isna(settings.get('Ver', np.nan)):
+            continue
+        for variable, t in CONFIG_TYPES.items():
+            value = settings.get(variable, np.nan)
+            if pd.isna(value):
+                raise Exception(f'{variable} is missing for {table} in the {sheet} sheet of the config')
+            try:
+                settings[variable] = t(value)
+            except ValueError:
+                raise Exception(f'{variable} for {table} in the {sheet} sheet of the config is not {t.__name__}: {value!r}')
+    return access
+
+def load_config(configPath, cache_file = None):
+    # Access settings of each site from the DataLakeDownload.xlsx workbook as {site: {table: {variable: value}}}, the same as read_excel(sheet_name=site, index_col='Variable').to_dict() (sheets without a Variable column are skipped)
+    # The workbook is parsed once and saved to cache_file (default {workbook}.cache.json, next to the workbook as it holds the credentials); later runs read the cache, without openpyxl, until the workbook is changed (modified time or size)
+    import json
+    configPath = pathlib.Path(configPath)
+    cache_file = configPath.with_suffix('.cache.json') if cache_file is None else pathlib.Path(cache_file)
+    stat = configPath.stat()
+    workbook = [stat.st_mtime_ns, stat.st_size]
+    if cache_file.is_file():
+        try:
+            with open(cache_file) as f:
+                cached = json.load(f)
+            if cached['workbook'] == workbook:
+                return cached['sites']
+        except (ValueError, KeyError) as e:
+            print(f'Rebuilding {cache_file}: {e!r}')
+    sites = {}
+    for sheet, df in pd.read_excel(configPath, sheet_name = None).items():
+        if 'Variable' in df.columns:
+            sites[sheet] = check_config(sheet, df.set_index('Variable').to_dict())
+    with open(cache_file, 'w') as f:
+        json.dump({'workbook': workbook, 'sites': sites}, f, indent = 1)
+    return sites
+
+class AzureStorage:
+    # Storage backend for the Azure datalake; download_data_from_datalake and AggregatedUploadAzure only talk to storage through list_files, download and upload so LocalStorage can stand in for it
+    def __init__(self, access, col):
+        self.service_client = get_service_client(access, col)
+
+    def list_files(self, file_system, prefix):
+        # Returns the path properties (name, content_length, last_modified, etag) of the files under prefix
+        return list(self.service_client.get_file_system_client(file_system).get_paths(prefix))
+
+    def download(self, file_system, path):
+        # Returns the contents of the file as bytes
+        return self.service_client.get_file_system_client(file_system).get_file_client(path).download_file().readall()
+
+    def download_to(self, file_system, path, f, offset=0, etag=None, chunk_size=4*1024*1024):
+        # Streams the file from byte offset to the end into the binary file object f in chunk_size pieces so memory does not depend on the file size
+        # etag: the download fails if the file has changed since it was listed so a resumed download is not mixed with a newer version
+        # Returns the MD5 of the whole file from its properties, None if it has none
+        from azure.core import MatchConditions
+        conditions = {'etag': etag, 'match_condition': MatchConditions.IfNotModified} if etag else {}
+        download = self.service_client.get_file_system_client(file_system).get_file_client(path).download_file(offset=offset, **conditions)
+        while True:
+            chunk = download.read(chunk_size)
+            if not chunk:
+                break
+            f.write(chunk)
+        md5 = download.properties.content_settings.content_md5
+        return bytes(md5) if md5 else None
+
+    def upload(self, file_system, path, stream, length, chunk_size=4*1024*1024, content_encoding=None):
+        # Uploads from a binary stream in chunk_size pieces, overwriting the file if it already exists
+        from azure.storage.filedatalake import ContentSettings
+        file_client = self.service_client.get_file_system_client(file_system).get_file_client(path)
+        file_client.create_file() # Creates the file in the datalake through the file client
+        content_settings = ContentSettings(content_type='text/csv', content_encoding=content_encoding) if content_encoding else None
+        file_client.upload_data(stream, length=length, overwrite=True, chunk_size=chunk_size, content_settings=content_settings)
+
+class LocalStorage:
+    # Storage backend using a local directory laid out like the datalake ({root}/{file_system}/{path}{YYYY}/{MM}/...); for running and benchmarking without credentials
+    # latency: seconds added to every call to mimic the round trip to the datalake
+    def __init__(self, root, latency=0.0):
+        self.root = pathlib.Path(root)
+        self.latency = latency
+
+    def list_files(self, file_system, prefix):
+        import time
+        import types
+        time.sleep(self.latency)
+        base = self.root / file_system
+        files = []
+        for f in sorted((base / prefix).rglob('*')) if (base / prefix).is_dir() else []:
+            if f.is_file():
+                stat = f.stat()
+                files.append(types.SimpleNamespace(name=f.relative_to(base).as_posix(), content_length=stat.st_size,
+                    last_modified=datetime.datetime.fromtimestamp(stat.st_mtime), etag=self.etag(stat)))
+        return files
+
+    def etag(self, stat):
+        # Stands in for the datalake etag; changes when the file is modified
+        return f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+
+    def download(self, file_system, path):
+        import time
+        time.sleep(self.latency)
+        return (self.root / file_system / path).read_bytes()
+
+    def download_to(self, file_system, path, f, offset=0, etag=None, chunk_size=4*1024*1024):
+        # Same as AzureStorage.download_to; the MD5 is worked out from the file as the datalake keeps it with the file properties
+        import time
+        time.sleep(self.latency)
+        source = self.root / file_system / path
+        if etag and (etag != self.etag(source.stat())):
+            raise Exception(f'{path} has changed since it was listed')
+        with open(source, 'rb') as src:
+            md5 = file_md5(src, chunk_size)
+            src.seek(offset)
+            while True:
+                chunk = src.read(chunk_size)
+                if not chunk:
+                    break
+                f.write(chunk)
+        return md5
+
+    def upload(self, file_system, path, stream, length, chunk_size=4*1024*1024, content_encoding=None):
+        import time
+        time.sleep(self.latency)
+        target = self.root / file_system / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with open(target, 'wb') as f:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                f.write(chunk)
+
+def file_md5(f, chunk_size=4*1024*1024):
+    # MD5 of a binary file object from its current position to the end, read a chunk at a time
+    import hashlib
+    md5 = hashlib.md5()
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        md5.update(chunk)
+    return md5.digest()
+
+def download_file(storage, file_system, blob, filePath, chunk_size=4*1024*1024):
+    # Downloads one datalake file (blob: path, size, last modified, etag as listed) to filePath; returns the number of bytes transferred
+    # The file is streamed to {filePath}.{etag}.part and only renamed to filePath once its size (and MD5, when the datalake has one) match, so an interrupted run never leaves a truncated file behind
+    # A part left by an interrupted run is resumed from where it stopped (the last byte is always fetched again so the file properties come with the download); parts of another version of the file are deleted
+    z, size, _, etag = blob
+    tag = ''.join(c for c in str(etag) if c.isalnum())
+    part = filePath.with_name(f'{filePath.name}.{tag}.part')
+    for old in filePath.parent.glob(glob.escape(filePath.name) + '.*.part'):
+        if old != part:
+            old.unlink()
+    offset = min(part.stat().st_size, max(size - 1, 0)) if part.is_file() else 0
+    with open(part, 'r+b' if offset else 'wb') as f:
+        f.truncate(offset)
+        f.seek(offset)
+        md5 = storage.download_to(file_system, z, f, offset, etag, chunk_size)
+    if part.stat().st_size != size:
+        raise Exception(f'{z}: downloaded {part.stat().st_size} bytes, expected {size}')
+    if md5:
+        with open(part, 'rb') as f:
+            if file_md5(f, chunk_size) != md5:
+                part.unlink() # Resuming a corrupt part would not fix it
+                raise Exception(f'{z}: MD5 does not match the datalake')
+    os.replace(part, filePath)
+    return size - offset
+
+def open_manifest(manifest):
+    # Opens (creates if needed) the local sqlite manifest of the datalake listings and downloaded files
+    import sqlite3
+    con = sqlite3.connect(str(manifest), timeout=60) # Jobs for other sites and tables running at the same time (LTARCAFTowerReport site_workers) can hold the lock while they write
+    con.execute('''CREATE TABLE IF NOT EXISTS blobs (
+        path TEXT PRIMARY KEY, size INTEGER, last_modified TEXT, etag TEXT, downloaded TEXT, processed INTEGER DEFAULT 0)''')
+    con.execute('''CREATE TABLE IF NOT EXISTS listings (prefix TEXT PRIMARY KEY, listed TEXT)''')
+    return con
+
+def mark_processed(manifest, blobs):
+    # Flags the files in the manifest as processed (aggregated and saved) so later runs do not download them again
+    con = open_manifest(manifest)
+    with con:
+        con.executemany('UPDATE blobs SET processed = 1 WHERE path = ?', [(b,) for b in blobs])
+    con.close()
+
+def download_data_from_datalake(access, s, col, siteName, endDate:datetime.date=None, concurrency:int=8, manifest=None, storage=None, metrics=None):
+    # concurrency: number of months listed and files downloaded at the same time
+    # manifest: path to a sqlite manifest of the listings and downloads (see open_manifest); files already processed with the same etag are not downloaded again
+    #   A month is not listed again once it has ended and a run has listed all of it (start and end dates around the whole month) and downloaded every file in it; files of those months that were downloaded but not processed (e.g. the run failed afterwards) are taken from the manifest
+    # storage: backend to download from (AzureStorage or LocalStorage); defaults to the Azure datalake in access
+    # metrics: RunMetrics the files listed, downloaded (and the bytes transferred), resumed and skipped are counted in
+    # Returns the datalake paths of the files within the dates that have not been processed yet
+    from concurrent.futures import ThreadPoolExecutor
+    import datetime
+    from datetime import date
+    from dateutil.relativedelta import relativedelta
+    import pathlib
+
+    end_date = date.today()
+    if endDate:
+        end_date = endDate
+        
+    # Get today's date
+    #today = date.today()
+
+    # Pull the access information from the driver Excel workbook for the datalake in question
+    access_path = access[col]['path']
+    localfile = access[col]['LOCAL_DIRECT']
+    # If localfile is not defined in xlsx file, then default to something like: input/CookEast/Met
+    if pd.isnull(localfile):
+        localfile = pathlib.Path(access[col]["inputPath"]) / siteName / col
+        localfile.mkdir(parents=True, exist_ok=True)
+    
+    file_system = access[col]['file_system']
+    back = access[col]['back']
+    # Connect to the Data Lake with the access credentials; client is shared with other downloads and uploads to the same account
+    if storage is None:
+        storage = AzureStorage(access, col)
+
+    known = {} # etag of files already processed, from the manifest
+    listed = set() # months already listed in full, from the manifest
+    pending = [] # files downloaded before but not processed yet, from the manifest
+    if manifest:
+        con = open_manifest(manifest)
+        known = dict(con.execute('SELECT path, etag FROM blobs WHERE processed = 1').fetchall())
+        listed = set(p for (p,) in con.execute('SELECT prefix FROM listings').fetchall())
+        pending = [tuple(b) for b in con.execute('SELECT path, size, last_modified, etag FROM blobs WHERE processed = 0').fetchall()]
+
+    # Build the month prefixes between the start and end dates
+    months = []
+    date_inc = datetime.date(s.year, s.month, 1)
+    while date_inc <= end_date:
+        months.append(f'{access_path}{date_inc.year:04d}/{date_inc.month:02d}')
+        date_inc = date_inc + relativedelta(months=1)
+
+    def in_dates(z):
+        # True if the date in the file name is within the start and end dates
+        #Y = z[-19:-15]; M = z[-14:-12]; D = z[-11:-9]
+        #bd = datetime.date(int(Y), int(M), int(D))  
+
+        date_components = z.split('/')[-1].split('_')[3:6]
+        bd = datetime.date(
+            int(date_components[0]), 
+            int(date_components[1]), 
+            int(date_components[2]))
+
+        return (bd >= s) & (bd<=end_date)
+
+    def list_month(month_path):
+        # Lists the files for a month; need to only download the ones within the dates
+        blobs = []
+        try:
+            for path in storage.list_files(file_system, month_path):
+                z = path.name
+                if in_dates(z):
+                    blobs.append((z, path.content_length, str(path.last_modified), path.etag))
+        except Exception as e:
+            print(e)
+            return month_path, blobs, False
+        return month_path, blobs, True
+
+    def download(blob):
+        # Downloads the file to the local directory if it is not already there (see download_file); returns True if the file is there afterwards
+        filePath = pathlib.Path(localfile) / pathlib.Path(blob[0]).name
+        if filePath.is_file() and (filePath.stat().st_size == blob[1]): # A file of another size is left from before downloads were checked, or has changed; downloaded again
+            print(f'Skipping {filePath}')
+            if metrics: metrics.count('files_skipped')
+            return True
+        try:
+            transferred = download_file(storage, file_system, blob, filePath)
+            print(str(filePath))
+            if metrics:
+                metrics.count('files_downloaded')
+                metrics.count('bytes_downloaded', transferred)
+                if transferred < blob[1]:
+                    metrics.count('files_resumed')
+            return True
+        except Exception as e:
+            print(e)
+            return False
+
+    # Listing and downloading are mostly waiting on the network so both run in a thread pool; concurrency limits how many requests are in flight at once
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        listings = list(pool.map(list_month, [m for m in months if m not in listed]))
+        blobs = [b for (_, month_blobs, _) in listings for b in month_blobs if known.get(b[0]) != b[3]] # Skip files processed before unless they changed
+        blobs += [b for b in pending if any(b[0].startswith(m + '/') for m in months if m in listed) and in_dates(b[0])]
+        if metrics:
+            metrics.count('files_listed', sum(len(month_blobs) for (_, month_blobs, _) in listings))
+        downloaded = list(pool.map(download, blobs))
+
+    if manifest:
+        now = str(datetime.datetime.now())
+        with con:
+            con.executemany('''INSERT INTO blobs (path, size, last_modified, etag, downloaded, processed) VALUES (?, ?, ?, ?, ?, 0)
+                ON CONFLICT(path) DO UPDATE SET size = excluded.size, last_modified = excluded.last_modified, etag = excluded.etag, downloaded = excluded.downloaded, processed = 0''',
+                [b + (now,) for b, ok in zip(blobs, downloaded) if ok])
+            # A month is only marked as listed once it is over (with a day of slack for late uploads) so the current month is always listed
+            # It also has to be listed from its first to its last day and all its files downloaded; otherwise the next run lists it again to get the files left out or that failed
+            failed = set(b[0] for b, ok in zip(blobs, downloaded) if not ok)
+            for (month_path, month_blobs, ok) in listings:
+                month_start = datetime.date(int(month_path[-7:-3]), int(month_path[-2:]), 1)
+                month_end = month_start + relativedelta(months=1)
+                whole_month = (s <= month_start) & (end_date >= month_end - datetime.timedelta(days=1))
+                if ok & whole_month & (datetime.date.today() > month_end) & all(b[0] not in failed for b in month_blobs):
+                    con.execute('INSERT OR REPLACE INTO listings (prefix, listed) VALUES (?, ?)', (month_path, now))
+        con.close()
+
+    return [b[0] for b, ok in zip(blobs, downloaded) if ok]
+
+
+def Data_Update_Azure(access, s,col, siteName):
+    raise Exception('Deprecated: use download_data_from_datalake instead') 
+    # Import libraries needed to connect and credential to the data lake.
+    from azure.storage.filedatalake import DataLakeServiceClient
+    from azure.identity import ClientSecretCredential
+    import datetime
+    from datetime import date
+    import pathlib
+
+    # Pulls today's data from the computer and uses as the end date.
+    e =  date.today()
+    # Pull the access information from the driver Excel workbook for the datalake in question
+    storage_account_name =  access[col]['storageaccountname']
+    client_id =  access[col]['CLIENTID']
+    tenant_id = access[col]['TENANTID']
+    client_secret = access[col]['CLIENTSECRET']
+    path = access[col]['path']
+    localfile = access[col]['LOCAL_DIRECT']
+    if pd.isnull(localfile):
+        localfile = pathlib.Path(access[col]["inputPath"]) / siteName
+        localfile.mkdir(parents=True, exist_ok=True)
+    
+    file_system = access[col]['file_system']
+    back = access[col]['back']
+    # Credential to the client and build the token
+    credential = ClientSecretCredential(tenant_id,client_id, client_secret)
+    # Collect the integer value of the month of the start date (s)
+    month = int(s.month)
+    year = int(s.year)
+    td = date.today()
+    # Connect to the Data Lake through this function with the access credentials; do not change this.
+    try:  
+        global service_client
+        service_client = DataLakeServiceClient(account_url="{}://{}.dfs.core.windows.net".format(
+            "https", storage_account_name), credential=credential)
+    except Exception as e:
+            print(e)
+    file_system_client = service_client.get_file_system_client(file_system)
+    # Still need to deal with year in the path.
+    # Checks that the month of the current date is the same or greater than the last month of the previous data's aggregation
+    yrt = False
+    while year<=td.year:
+        if year<td.year:
+            paths = file_system_client.get_paths(path+ str(s.year) +'/'+str(s.month))
+            for path in paths:
+                z = path.name
+                Y = z[-19:-15]; M = z[-14:-12]; D = z[-11:-9]
+                bd = datetime.date(int(Y), int(M), int(D))                    
+                if (bd >= s)& (bd<=e):
+                # If dates are within the correct range, downloads the file to the local directory
+                    #local_file = open(localfile+z[back:],'wb'); print(local_file)                
+                    filePath = localfile / pathlib.Path(z).name
+                    if not filePath.is_file():
+                        local_file = open(filePath, 'wb')
+                        print(str(filePath))
+                        file_client = file_system_client.get_file_client(z)
+                        download = file_client.download_file()
+                        downloaded_bytes = download.readall()
+                        local_file.write(downloaded_bytes)
+                        local_file.close()
+                    else:
+                        print(f'Skipping {filePath}')
+            year = year+1
+            yrt = True    
+        if year == td.year:
+            path = access[col]['path']
+            if yrt: month = int(e.month)
+            while td.month >= month:
+        # Check if month int/string is correct or not; the path needs a 2-digit month and an int value will default to 1 digit is less than 10.
+                if month < 10:
+                    paths = file_system_client.get_paths(path+ str(e)[0:4] +'/0'+str(month))
+                elif month >=10:
+                    paths = file_system_client.get_paths(path+ str(e)[0:4] +'/'+str(month))
+        # Loop over all the path names and build path to download to the local file.
+                for path in paths:
+                    z = path.name
+            # Builds datetime of the current path and checks against the start and end dates
+                    Y = z[-19:-15]; M = z[-14:-12]; D = z[-11:-9]
+                    bd = datetime.date(int(Y), int(M), int(D))                    
+                    if (bd >= s)& (bd<=e):
+                # If dates are within the correct range, downloads the file to the local directory
+                        local_file = open(localfile / z.split('/')[-1],'wb'); print(local_file)                
+                        file_client = file_system_client.get_file_client(z)
+                        download = file_client.download_file()
+                        downloaded_bytes = download.readall()
+                        local_file.write(downloaded_bytes)
+                        local_file.close()
+                month = month+1 # While loop so needs a way to exit the loop counter
+                path = access[col]['path'] # Print path name of files downloaded for user to look at it and admire.
+        year = year+1
+        
+def wateryear(calendar_date:datetime.date = datetime.date.today()):
+    # Calculate what the wateryear is; checks if it is Ooctober or not; if so then adds one to the year to get to the correct water year. 
+
+    if int(str(calendar_date).replace('-','')[4:6]) < 10:
+        wateryear = str(calendar_date).replace('-','')[0:4]
+    else:
+        wateryear = str(int(str(calendar_date).replace('-','')[0:4])+1)
+    return wateryear # Returns water year as a string.
+
+def get_latest_file(files):
+    """Takes a list of files (probably from glob) and returns the one with the latest date stamp (in form of _YYYYMMDD at end of the filename)
+    """
+
+    latest_file = files[0]
+
+    for f in files:
+        if get_datetime_from_filename(f) > get_datetime_from_filename(latest_file):
+            latest_file = f
+
+    return latest_file
+
+def get_datetime_from_filename(filestring:str):
+    """Takes a filename or filepath string and returns a datetime object representing the iso date in the filename
+    """
+    import datetime
+
+    stem = pathlib.Path(filestring).stem
+    isodate = stem.split('_')[-1]
+    dt = datetime.datetime.strptime(isodate, '%Y%m%d')
+
+    return dt
+
+
+def get_columnar_file(aggregated_file):
+    """Takes the path of an aggregated csv file and returns the path of its parquet copy if one exists and is at least as new as the csv, otherwise None
+    """
+    columnar_file = pathlib.Path(aggregated_file).with_suffix('.parquet')
+    if columnar_file.is_file() and (columnar_file.stat().st_mtime >= pathlib.Path(aggregated_file).stat().st_mtime):
+        return str(columnar_file)
+    return None
+
+def read_aggregated(aggregated_file, col, Time, compact = False, columns = None, start = None, end = None):
+    # Reads an aggregated file; uses the parquet copy when there is one as it skips parsing the text, otherwise reads the csv
+    # compact: reads into the compact types (see compact_dtypes) to use about half the memory
+    # columns: only read these columns (plus TIMESTAMP and RECORD); None reads them all
+    # start/end: only read the rows in this time range (both included); the csv is bisected for the range and parquet skips the row groups outside it
+    columnar_file = get_columnar_file(aggregated_file)
+    if columnar_file:
+        try:
+            df = Fast_Read([columnar_file], 1, Time, columns=columns, start=start, end=end)
+            return compact_frame(df, detect_aggregated_type(aggregated_file, col)) if compact else df
+        except ImportError as e:
+            print(f'{e}; reading csv instead') # No parquet engine (pyarrow) installed
+    dataset_type = detect_aggregated_type(aggregated_file, col)
+    df = Fast_Read([aggregated_file],1, Time, get_dtypes(dataset_type, compact), columns=columns, start=start, end=end)
+    return compact_frame(df, dataset_type) if compact else df # Columns that are not in the schema are read as float64/object
+
+def write_columnar(df, fpath, col):
+    # Writes a typed parquet copy of the aggregated file next to the csv
+    dtypes = get_dtypes(detect_aggregated_type(fpath, col))
+    types = {}
+    for c in df.columns:
+        if df[c].dtype == object: # Parquet needs a single type per column; declared numeric columns are converted, anything else is stored as text like in the csv
+            types[c] = dtypes[c] if dtypes.get(c) in (float, 'Int64') else 'string'
+    try:
+        df.astype(types).to_parquet(pathlib.Path(fpath).with_suffix('.parquet'), index=True, row_group_size=1440) # About a month of 30 minute data per row group so reads of a time range skip the rest
+    except ImportError as e:
+        print(f'{e}; only the csv was saved') # No parquet engine (pyarrow) installed
+
+def csv_values(df):
+    # float32 columns (compact mode) are written with numpy's formatting, which uses scientific notation from 1e6 up (and for 1e-4 itself) where float64 does not
+    # Columns holding such values are widened through their decimal form so the csv is the same as from float64; other columns are written as they are
+    wide = {}
+    for c in df.columns[df.dtypes == np.float32]:
+        x = np.abs(df[c].to_numpy())
+        if ((x == np.float32(1e-4)) | ((x >= 1e6) & (x < 1e16))).any():
+            wide[c] = float64_values(df[c])
+    return df.assign(**wide) if wide else df
+
+def write_aggregated(df, fpath, col, file_format = 'csv'):
+    # Writes the aggregated file as csv (the format uploaded for the data manager); file_format = 'parquet' also writes a typed parquet copy next to it for faster reads
+    csv_values(df).to_csv(fpath, index_label = 'TIMESTAMP')
+    if file_format == 'parquet':
+        write_columnar(df, fpath, col)
+    elif file_format != 'csv':
+        raise Exception(f'Unknown file format {file_format}; use csv or parquet')
+
+def append_aggregated(tail, aggregated_file, fpath):
+    # Writes the aggregated file by copying the lines of the previous aggregated csv that come before the tail and adding the tail rows; saves formatting the whole water year again
+    # Written to a temporary file first as aggregated_file and fpath are the same file when run more than once a day
+    start = str(tail.index[0]).encode()
+    tmp = str(fpath) + '.tmp'
+    with open(aggregated_file, 'rb') as src, open(tmp, 'wb') as dst:
+        dst.write(src.readline()) # Header line
+        for line in src:
+            if line[:len(start)] >= start: # Timestamps are ISO formatted so compare as text
+                break
+            dst.write(line)
+    with open(tmp, 'a', newline='') as dst:
+        csv_values(tail).to_csv(dst, header = False)
+    os.replace(tmp, fpath)
+
+def get_last_timestamp(aggregated_file):
+    """Returns the last timestamp in an aggregated csv file by reading back from the end of the file, so the body does not need to be parsed
+    """
+    with open(aggregated_file, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        block = 4096
+        while True:
+            start = max(0, end - block)
+            f.seek(start)
+            lines = [l for l in f.read(end - start).splitlines() if l.strip()]
+            if (len(lines) > 1) | (start == 0): # More than one line means the last one is complete
+                break
+            block = block*2
+    if (start == 0) & (len(lines) < 2):
+        raise Exception(f'No data in {aggregated_file}')
+    return pd.Timestamp(lines[-1].split(b',')[0].decode().strip('"'))
+
+def get_latest_date_from_file(col, Time, CEF):
+    aggregated_file = get_latest_file(glob.glob(CEF))
+
+    last = get_last_timestamp(aggregated_file) # Last index in the file; the file is sorted and already padded to the end of the day so this matches the index of the full read
+    s = str(last)[0:10]; s= s.replace('-', '') # Convert to a string
+    s = datetime.date(int(s[0:4]), int(s[4:6]), int(s[6:])) - datetime.timedelta(days=1)
+
+    return s
+
+def get_last_date_of_wateryear(wateryear:int):
+    dt = datetime.date(wateryear, 9, 30)
+
+    return dt
+
+def get_first_date_of_wateryear(wateryear:int):
+    dt = datetime.date(wateryear-1, 10, 1)
+
+    return dt
+
+def compress_file(fpath, compression):
+    # Compresses a file in chunks so memory use does not depend on the file size; returns the path of the compressed copy (fpath + .gz or .zst)
+    import shutil
+    if compression == 'gzip':
+        import gzip
+        out = str(fpath) + '.gz'
+        with open(fpath, 'rb') as src, gzip.open(out, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1024*1024)
+    elif compression == 'zstd':
+        import zstandard # Optional; only needed for zstd compression
+        out = str(fpath) + '.zst'
+        with open(fpath, 'rb') as src, open(out, 'wb') as dst:
+            zstandard.ZstdCompressor().copy_stream(src, dst)
+    else:
+        raise Exception(f'Unknown compression {compression}; use gzip or zstd')
+    return out
+
+def AggregatedUploadAzure(fname, access, col, CEF, cy, compression=None, chunk_size=4*1024*1024, storage=None, metrics=None):
+    # Upload the aggregated file to the datalake
+    # The file is streamed from disk in chunk_size pieces so memory stays flat whatever the file size
+    # compression: None, 'gzip' or 'zstd'; uploads a compressed copy under the same name with the content encoding set so clients can decompress it
+    # storage: backend to upload to (AzureStorage or LocalStorage); defaults to the Azure datalake in access
+    # metrics: RunMetrics the bytes uploaded (after compression) are counted in
+    upload_dir = access[col]['UPLOAD']
+    if storage is None:
+        storage = AzureStorage(access, col) # Client for the account in the access Excel workbook; reused from the download if already built
+    upload_path = CEF
+    if compression:
+        upload_path = compress_file(CEF, compression)
+    try:
+        with open(upload_path, 'rb') as local_file: # Opens the local copy of the aggregated file 
+            # Builds file path based on cropyear (water year) and upload directory; overwrites the file if it already exists, depending on how often code is run
+            storage.upload(upload_dir+cy+'/', fname, local_file, os.path.getsize(upload_path), chunk_size, compression)
+        if metrics: metrics.count('bytes_uploaded', os.path.getsize(upload_path))
+    finally:
+        if compression:
+            os.remove(upload_path) # Compressed copy only needed for the upload
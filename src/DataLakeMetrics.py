@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Stage timers and counters for the AccessAzure runs, written out as a JSON record per run
+Part of the AzureDataLakeAccess library (which brings in the names in __all__); see the readme within this repo for more details about the different scripts used
+"""
+import pathlib
+import datetime
+import time
+import json
+import sys
+import threading
+import contextlib
+
+__all__ = ['RunMetrics']
+
+def peak_rss_mb():
+    # Peak resident memory of this process in MB (worker processes are not included); None when it can't be read (Windows without psutil installed)
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak/1024**2 if sys.platform == 'darwin' else peak/1024 # Bytes on macOS, KB on Linux
+    except ImportError:
+        pass
+    try:
+        import psutil # Optional; only needed for the peak memory on Windows
+        return psutil.Process().memory_info().peak_wset/1024**2
+    except (ImportError, AttributeError):
+        return None
+
+class RunMetrics:
+    # Stage timers and counters for one run (e.g., AccessAzure for one site and table); see write for the record
+    # profile: also runs cProfile for each stage (main thread only); write dumps the stats of the slowest stage
+    def __init__(self, site = None, table = None, profile = False):
+        self.site = site
+        self.table = table
+        self.profile = profile
+        self.started = datetime.datetime.now()
+        self.t0 = time.perf_counter()
+        self.stages = {} # Seconds per stage, in the order the stages first ran
+        self.counters = {}
+        self.profiles = {}
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        # Times the code in the with block as the stage name; the time adds up if the stage runs more than once. Stages can't be nested when profiling
+        if self.profile:
+            import cProfile
+            profiler = self.profiles.setdefault(name, cProfile.Profile())
+            profiler.enable()
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0) + time.perf_counter() - t0
+            if self.profile:
+                profiler.disable()
+
+    def count(self, name, n = 1):
+        # Adds n to the counter name; safe to call from the download threads
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def record(self):
+        # The run as a dictionary: site, table, start time, total and stage seconds, counters and peak memory
+        return {'site': self.site, 'table': self.table, 'started': self.started.isoformat(timespec='seconds'), 'total_seconds': time.perf_counter() - self.t0,
+            'stages': dict(self.stages), 'counters': dict(self.counters), 'peak_rss_mb': peak_rss_mb()}
+
+    def summary(self):
+        # One line of the stage times for printing
+        return ', '.join(f'{name} {seconds:.2f} s' for name, seconds in self.stages.items())
+
+    def write(self, directory):
+        # Writes the record to {directory}/{site}_{table}_{YYYYMMDDTHHMMSS}.json; when profiling, the stats of the slowest stage are saved next to it as .prof (open with pstats or snakeviz)
+        # Returns the record
+        record = self.record()
+        directory = pathlib.Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        name = f'{self.site}_{self.table}_{self.started:%Y%m%dT%H%M%S}'
+        if self.profile and self.stages:
+            slowest = max(self.stages, key=self.stages.get)
+            self.profiles[slowest].dump_stats(str(directory / (name + '.prof')))
+            record['profiled_stage'] = slowest
+        with open(directory / (name + '.json'), 'w') as f:
+            json.dump(record, f, indent = 1)
+        return record
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Eric Russell, Assistant Research Professor, CEE WSU
+@author: Bryan Carlson, Ecoinformaticist, USDA-ARS
+contact: eric.s.russell@wsu.edu
+Plot formatting
+Part of the AzureDataLakeAccess library (which brings in the names in __all__); see the readme within this repo for more details about the different scripts used
+"""
+
+__all__ = ['format_plot']
+
+def format_plot(ax,yf,xf,xminor,yminor,yl,yu,xl,xu):
+    #subplot has to have ax as the axis handle
+    # Does not accept blank arguments within the function call; needs to be a number of some sort even if just a 0.
+    # Format the x and yticks
+    import matplotlib.pyplot as plt # Imported here so the other functions do not need matplotlib loaded
+    from matplotlib.ticker import AutoMinorLocator
+    plt.yticks(fontsize = yf)
+    plt.xticks(fontsize = xf)
+    minor_locator = AutoMinorLocator(xminor)
+    ax.xaxis.set_minor_locator(minor_locator)
+    minor_locator = AutoMinorLocator(yminor)
+    ax.yaxis.set_minor_locator(minor_locator)
+    ax.tick_params(axis='both',direction='in',length=12.5,width=2)
+    ax.tick_params(axis='both',which = 'minor',direction='in',length=5)
+    plt.ylim([yl,yu])
+    plt.xlim([xl,xu])  
+    return
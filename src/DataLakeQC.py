@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Eric Russell, Assistant Research Professor, CEE WSU
+@author: Bryan Carlson, Ecoinformaticist, USDA-ARS
+contact: eric.s.russell@wsu.edu
+QC functions for the flux and meteorology data
+Part of the AzureDataLakeAccess library (which brings in the names in __all__); see the readme within this repo for more details about the different scripts used
+"""
+import pandas as pd
+import numpy as np
+
+# Names brought into AzureDataLakeAccess; the rest are helpers for these
+__all__ = ['readinfo', 'Grade_cs', 'METQC_COLUMNS', 'MET_QC_RULES', 'METQC', 'stuck_days', 'Met_QAQC']
+
+#%% QC for the flux data for the Azure upload    
+    
+def readinfo(access):
+    # Values pulled in from a separate *.csv file because easier and flexible; are the QC values for the flux qc function
+    grade = int(access['Flux']['grade'])
+    LE_B = [float(access['Flux']['LE_B']),float(access['Met']['LE_B'])]
+    H_B = [float(access['Flux']['H_B']),float(access['Met']['H_B'])]
+    F_B = [float(access['Flux']['F_B']),float(access['Met']['F_B'])]
+    ustar = float(access['Flux']['ustar'])
+    gg = [(access['Flux']['gg']),(access['Met']['gg']),(access['Val_3']['gg'])]
+    col = [(access['Flux']['cls']),(access['Met']['cls']),(access['Val_3']['cls'])]
+    return grade, LE_B, H_B, F_B, ustar, col, gg
+
+def float64_values(x):
+    # Values of a column as float64 for the QC checks; float32 columns (compact mode, see compact_dtypes) go through their shortest decimal form so the checks and derived values see the same numbers as a float64 read of the file
+    if x.dtype == np.float32:
+        return x.to_numpy().astype(str).astype(np.float64)
+    return x.astype(float).to_numpy()
+
+def flux_flag_checks(data, flux, bounds, grade_column, grade):
+    # QC checks for one flux column in the order they make up the flag string; returns a dictionary of check name to fail (True = flagged) arrays
+    # values for columns hardcoded assuming they do not change for the EasyFlux code; will need to be updated if column names change
+    def values(c):
+        return float64_values(data[c])
+    x = values(flux)
+    checks = {'bounds': ~((x >= bounds[0]) & (x <= bounds[1]))} # Bounds checks for each of the flux values; set in driver sheet. Missing values fail.
+    checks['grade'] = ~(values(grade_column) <= grade) # Check flux against the developed turbulence grades
+    if 'Precipitation_Tot' in data.columns: # Check if recorded precip or not; if so, filter fluxes
+        checks['precip'] = ~(values('Precipitation_Tot') < 0.001)
+    #10Hz sample Mask                  
+    if 'CO2_sig_strgth_Min' in data.columns: # Check is co2 sig strength is high enough
+        checks['co2_signal'] = ~(values('CO2_sig_strgth_Min') > 0.7)
+    if 'H2O_sig_strgth_Min' in data.columns: # Check if h20 sig strength is high enough
+        checks['h2o_signal'] = ~(values('H2O_sig_strgth_Min') > 0.7)
+    if 'sonic_samples_Tot' in data.columns: # Check if enough samples in the sonic column (80% coverage); 
+        checks['sonic_samples'] = ~(values('sonic_samples_Tot') > 14400)
+    if 'Fc_samples_Tot' in data.columns: # Check if enough samples in Fc column (80%) coverage
+        checks['irga_samples'] = ~(values('Fc_samples_Tot') > 14400)
+    #Door Open Mask
+    if 'door_is_open_Hst' in data.columns: # Check if door open meaning people at the site doing work
+        checks['door'] = ~(values('door_is_open_Hst') == 0)
+    return checks
+
+def encode_flags(checks):
+    # Packs the fail arrays into one integer per row in a single pass; the first check is the highest bit so the binary form reads like the flag string
+    fails = np.column_stack(list(checks.values()))
+    return fails.astype(np.uint16) @ (1 << np.arange(fails.shape[1] - 1, -1, -1, dtype=np.uint16))
+
+def decode_flags(bits, n_checks):
+    # Flag strings as written to the aggregated files ('0' pass/'1' fail per check, first check first) from the bitmasks; a lookup into the 2**n_checks possible strings
+    table = np.array([format(i, f'0{n_checks}b') for i in range(2**n_checks)], dtype=object)
+    return table[bits]
+
+def Grade_cs(data,access):
+    # Basic flux qc function; more serious codeset not included.
+    # The checks for each flux are packed into an integer bitmask (encode_flags) and written out as the flag strings (decode_flags)
+    grade, LE_B, H_B, F_B, ustar,col,gg = readinfo(access)
+    #pd.options.mode.chained_assignment = None # Don't remember exactly why this is here; probably to avoid a warning statement somewhere 
+    if (grade >9) | (grade<1): # Check that the grade value falls within acceptable bounds
+        print('Grade number must be between 1-9.')
+        return  # 'exit' function and return error 
+    if (ustar<0): # Check that ustar is okay though default should be zero; no ustar filter should be used here.
+        print('u-star must be a positive number.')
+        return  # 'exit' function and return error 
+    var = ['H_Flags','LE_Flags','Fc_Flags'] # Set flag column names
+    if var[0] not in data: # Create flag columns if they do not already exist 
+        Marker = [];Marker = pd.DataFrame(Marker, columns = var)
+        data = data.join(Marker)
+    bounds = [H_B, LE_B, F_B]
+    for k in range (0,3): # Loops over the H, LE, and co2 flux columns; 
+        checks = flux_flag_checks(data, col[k], bounds[k], gg[k], grade)
+        data[var[k]] = decode_flags(encode_flags(checks), len(checks))
+        ok = {name: ~fail for name, fail in checks.items()}
+        samples = ok.get('sonic_samples', True) | ok.get('irga_samples', True)
+        if 'door' in ok: # Create single boolean from all the qc checks; only one fail will trigger fail
+            Good = ok['precip'] & ok['grade'] & ok['door'] & ok['bounds'] & ok['co2_signal'] & ok['h2o_signal'] & samples
+        else: # If door open is not part of the column set; should be with the logger data
+            Good = ok['grade'] & ok['bounds'] & samples
+        data[(col[k]+'_Graded')] = data[col[k]].where(Good) # Create the flux graded column with nan/blank if data is bad/filtered
+    return data
+    
+#%%
+    
+# Columns passed to Met_QAQC for the flux and met tables; different columns between the two for some reason, think has to do with the way the tables were constructed in the logger code
+METQC_COLUMNS = {
+    'Flux': {'RH': 'RH_Avg', 'P': 'amb_press_Avg', 'Tair': 'amb_tmpr_Avg', 'WS': 'rslt_wnd_spd', 'WD': 'wnd_dir_compass', 'Precip': 'Precipitation_Tot',
+             'PAR': 'PAR_density_Avg', 'Rn': 'Rn_meas_Avg', 'VPD': 'VPD_air', 'e': 'e_Avg', 'e_s': 'e_sat_Avg'},
+    'Met': {'RH': 'RH_Avg', 'P': 'amb_press_Avg', 'Tair': 'amb_tmpr_Avg', 'WS': 'rslt_wnd_spd', 'WD': 'wnd_dir_compass', 'Precip': 'Precipitation_Tot',
+            'PAR': 'PAR_density_Avg', 'Rn': 'Rn_meas_Avg', 'VPD': 'VPD_air', 'e': 'e', 'e_s': 'e_sat'},
+}
+
+# QC rules for Met_QAQC, one per variable in the order the columns are output; adding a sensor is adding a rule (and its column to METQC_COLUMNS)
+#   limits: (lower, upper, bounds) hard limits; bounds is '[]' for both inclusive or '[)' for an exclusive upper limit
+#   max_step: largest allowed rise from the previous time step; step_below makes the limit itself fail and step_nan_ok lets a missing previous value pass
+#   flag_repeats: value unchanged from the previous time step fails (stuck sensor)
+#   day_change: checks for stuck sensors; days where all the values are the same (no variance) fail and are flagged in {var}_Day_Change (see stuck_days)
+#   cap: (lower, upper); values in this range are flagged in {var}_gt_{lower} and set to lower in the filtered values if they pass the checks
+#   derived: variable is computed from others (MSLP from P and Tair) and kept in the output
+#   missing: message printed when the variable is not given
+MET_QC_RULES = {
+    'Tair': {'limits': (-40, 50, '[]'), 'max_step': 15, 'step_below': True, 'step_nan_ok': True, 'flag_repeats': True, 'day_change': True, 'missing': '******Temperature not present******'},
+    'RH': {'limits': (0, 103, '[]'), 'cap': (100, 103), 'max_step': 50, 'flag_repeats': True, 'day_change': True, 'missing': '**** RH not present ****'},
+    'P': {'limits': (80, 100, '[]'), 'max_step': 3.1, 'flag_repeats': True, 'missing': '**** Pressure not present ****'},
+    'MSLP': {'limits': (80, 110, '[]'), 'max_step': 31, 'flag_repeats': True, 'derived': True, 'missing': '**** Mean sea level pressure not present ****'},
+    'WS': {'limits': (0, 60, '[)'), 'max_step': 15, 'flag_repeats': True, 'day_change': True, 'missing': '**** Wind Speed not present ****'},
+    'WD': {'limits': (0, 360, '[)'), 'flag_repeats': True, 'missing': '**** Wind Direction not present ****'},
+    'PAR': {'limits': (0, 5000, '[)'), 'max_step': 1500, 'day_change': True, 'missing': '**** PAR not present ****'},
+    'Rn': {'limits': (-150, 1500, '[]'), 'max_step': 500, 'flag_repeats': True, 'day_change': True, 'missing': '**** Net Radiations not present ****'},
+    'Precip': {'limits': (0, 100, '[)'), 'missing': '**** Precipitation not present ****'}, # Extra checks against RH and Tair in Met_QAQC
+    'VPD': {'limits': (0, 50, '[)'), 'max_step': 10, 'flag_repeats': True, 'day_change': True},
+    'e': {'limits': (0, 50, '[)'), 'max_step': 10, 'flag_repeats': True, 'day_change': True},
+    'e_s': {'limits': (0, 50, '[)'), 'max_step': 10, 'flag_repeats': True, 'day_change': True},
+}
+
+def METQC(Data, col):
+    # Driver for the met qc function to deal with some column shenanigans; the column names for each table are in METQC_COLUMNS
+    Met_QC = Met_QAQC(**{var: Data[c] for var, c in METQC_COLUMNS[col].items()}, z = 0.777)
+    if 'Tair_Filtered' in Data.columns: # Checks if the data has already been through the QC code or not; 
+        # Drops all columns in the metqc variable before readding them back; the QC occurs over the entire dataframe so will re-addd what was deleted; prevents adding multiple columns to the dataframe with the same header
+        # Not sure why this is the case and this is a quick fix but don't like it
+        Data = Data.drop(columns=[c for c in Met_QC.columns if c in Data.columns])
+    Data = pd.concat([Data,Met_QC], axis = 1, sort=False) # Concat the metqc values to the dataframe.
+    return Data
+
+def stuck_days(X, index):
+    # Stuck/flatlined sensor check for all the variables (columns of X) in one grouped pass over the days of the index
+    # A day where a variable has at least two values and they are all the same (zero range, so zero variance) is stuck; returns a boolean matrix like X that is True on every time step of a stuck day
+    # Repeats between consecutive time steps are already caught row by row by flag_repeats so only whole days are checked here
+    # The smallest and largest value and the count of each run of time steps on the same day are reduced straight from X (fmin/fmax skip NaN) so no copy of X is made
+    day = pd.DatetimeIndex(index).floor('D').asi8
+    if len(day) == 0:
+        return np.zeros(X.shape, dtype=bool)
+    starts = np.flatnonzero(np.r_[True, day[1:] != day[:-1]])
+    lo = np.fmin.reduceat(X, starts, axis=0)
+    hi = np.fmax.reduceat(X, starts, axis=0)
+    count = np.column_stack([np.add.reduceat(~np.isnan(X[:, k]), starts, dtype=np.int64) for k in range(X.shape[1])]) # A column at a time so the counts are not widened for the whole matrix
+    if (day[1:] >= day[:-1]).all(): # Index in time order (as after indx_fill): one run per day
+        stuck = (hi - lo == 0) & (count >= 2)
+        return np.repeat(stuck, np.diff(np.r_[starts, len(day)]), axis=0) # Broadcast the daily flags back to the time steps
+    # Out of time order so a day can be split over several runs; combine them
+    codes = pd.factorize(day)[0]
+    run_codes = codes[starts]
+    days = codes.max() + 1
+    day_lo = np.full((days, X.shape[1]), np.nan); np.fmin.at(day_lo, run_codes, lo)
+    day_hi = np.full((days, X.shape[1]), np.nan); np.fmax.at(day_hi, run_codes, hi)
+    day_count = np.zeros((days, X.shape[1]), dtype=np.int64); np.add.at(day_count, run_codes, count)
+    stuck = (day_hi - day_lo == 0) & (day_count >= 2)
+    return stuck[codes]
+
+# Rows of the step and repeat checks in Met_QAQC done at a time; the differences for a block are STEP_BLOCK_ROWS x variables floats
+STEP_BLOCK_ROWS = 4096
+
+def Met_QAQC(**kwargs):
+    # Met QC for the variables given as keyword arguments (Tair, RH, P, WS, WD, PAR, Rn, Precip, VPD, e, e_s; z for MSLP) using the rules in MET_QC_RULES
+    # All variables are stacked into one float matrix so the limit, step and repeat checks are a single NumPy evaluation over every variable at once
+    # The checks are written into boolean buffers and the matrix is filtered in place, so the filtered columns of the output are views of it and nothing else the size of the data is kept
+    index = None
+    names = []
+    for var, rule in MET_QC_RULES.items():
+        if rule.get('derived'):
+            continue
+        if var in kwargs.keys():
+            names.append(var)
+            index = kwargs[var].index if index is None else index
+        elif 'missing' in rule:
+            print(rule['missing'])
+    if index is None:
+        return None
+    derive = ('P' in names) & ('Tair' in names) & ('z' in kwargs.keys())
+    if ('P' in names) & (not derive):
+        print(MET_QC_RULES['MSLP']['missing'])
+    names = [var for var in MET_QC_RULES if (var in names) | ((var == 'MSLP') & derive)]
+    rules = [MET_QC_RULES[var] for var in names]
+    col = {var: k for k, var in enumerate(names)}
+
+    # Columns of X are the variables; filled one at a time (Fortran order so each column is contiguous) so only one converted column is held besides it
+    X = np.empty((len(index), len(names)), order='F')
+    for var, k in col.items():
+        if var != 'MSLP':
+            X[:, k] = float64_values(kwargs[var])
+    if derive:
+        H = (8.314*(X[:, col['Tair']]+273.15))/(0.029*9.81)/1000 # Scale height
+        X[:, col['MSLP']] = X[:, col['P']]/np.exp(-kwargs['z']/H) # Mean Sea Level Pressure
+
+    # Hard limits; an exclusive upper limit u is the same as <= the float just below u
+    lower = np.array([r['limits'][0] for r in rules], dtype=float)
+    upper = np.array([r['limits'][1] if r['limits'][2] == '[]' else np.nextafter(r['limits'][1], -np.inf) for r in rules], dtype=float)
+    hard = np.greater_equal(X, lower)
+    tmp = np.empty(X.shape, dtype=bool, order='F')
+    hard &= np.less_equal(X, upper, out=tmp)
+
+    # Change from the previous time step (same as diff()): largest allowed step and repeated values
+    max_step = np.array([(r['max_step'] if not r.get('step_below') else np.nextafter(r['max_step'], -np.inf)) if 'max_step' in r else np.inf for r in rules])
+    step_nan_ok = np.array([r.get('step_nan_ok', False) or ('max_step' not in r) for r in rules])
+    repeats = np.array([r.get('flag_repeats', False) for r in rules])
+    # Done in blocks of rows (all the variables at once) so the differences are never held for the whole matrix
+    change = np.empty(X.shape, dtype=bool, order='F')
+    for start in range(0, len(X), STEP_BLOCK_ROWS):
+        end = min(start + STEP_BLOCK_ROWS, len(X))
+        D = np.empty((end - start, X.shape[1]))
+        D[0] = X[start] - X[start-1] if start else np.nan
+        np.subtract(X[start+1:end], X[start:end-1], out=D[1:])
+        c = change[start:end]
+        np.less_equal(D, max_step, out=c)
+        c |= np.isnan(D) & step_nan_ok
+        c &= (D != 0) | ~repeats
+
+    has_day_change = np.array([r.get('day_change', False) for r in rules])
+    day_change = stuck_days(X, index)
+    np.logical_not(day_change, out=day_change)
+    day_change |= ~has_day_change # Checks if the daily values change at all
+
+    Q = {}
+    # Values kept as they are (derived and Precip) and the caps come from the data before it is filtered
+    raw = {var: X[:, col[var]].copy() for var, rule in zip(names, rules) if rule.get('derived')}
+    capped = {var: (X[:, col[var]] >= rule['cap'][0]) & (X[:, col[var]] <= rule['cap'][1]) for var, rule in zip(names, rules) if 'cap' in rule}
+    np.logical_and(hard, change, out=tmp)
+    tmp &= day_change
+    if 'Precip' in col:
+        tmp[:, col['Precip']] = True # Precip has its own filters below
+    X[~tmp] = np.nan # X is the filtered values from here on
+    del tmp
+
+    for var, rule in zip(names, rules):
+        k = col[var]
+        if var == 'Precip':
+            x = X[:, k]
+            Q['Precip_Hard_Limit'] = hard[:, k]
+            # Lot of filters because of the difference of precip is there is or is not RH and check for frozen precip with temperature as the tipping bucket is bad with snow
+            good = hard[:, k].copy()
+            if 'RH' in col:
+                Q['Precip_RH_gt_90'] = (x > 0) & (Q['RH_Filtered'] >= 90)
+                good &= Q['Precip_RH_gt_90']
+            if 'Tair' in col:
+                Q['Precip_Tair_lt_Zero'] = (x > 0) & (Q['Tair_Filtered'] < 0)
+                good &= ~Q['Precip_Tair_lt_Zero']
+            x[~(good | np.isnan(x))] = 0 # Precip that fails the checks is set to zero; missing values stay missing
+            Q['Precip_Filtered'] = x
+            continue
+        if rule.get('derived'):
+            Q[var] = raw[var]
+        Q[f'{var}_Hard_Limit'] = hard[:, k]
+        if 'cap' in rule:
+            Q[f'{var}_gt_{rule["cap"][0]}'] = capped[var]
+        Q[f'{var}_Change'] = change[:, k]
+        if rule.get('day_change'):
+            Q[f'{var}_Day_Change'] = day_change[:, k]
+        Q[f'{var}_Filtered'] = X[:, k]
+        if 'cap' in rule:
+            Q[f'{var}_Filtered'][capped[var] & ~np.isnan(X[:, k])] = rule['cap'][0]
+    return pd.DataFrame(Q, index=index, copy=False) # Columns are not copied into one block
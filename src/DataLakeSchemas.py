@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Eric Russell, Assistant Research Professor, CEE WSU
+@author: Bryan Carlson, Ecoinformaticist, USDA-ARS
+contact: eric.s.russell@wsu.edu
+Column types (schemas) of the logger and aggregated files and the compact types
+Part of the AzureDataLakeAccess library (which brings in the names in __all__); see the readme within this repo for more details about the different scripts used
+"""
+import pathlib
+import pandas as pd
+import numpy as np
+import os
+
+from DataLakeQC import MET_QC_RULES
+
+# Names brought into AzureDataLakeAccess; the schemas cache and SCHEMA_TYPES are used through the functions
+__all__ = ['SCHEMA_FILE', 'COMPACT_CATEGORIES', 'COMPACT_KEEP', 'compact_dtypes', 'compact_frame', 'load_schemas', 'get_dtypes',
+           'detect_dataset_type', 'detect_aggregated_type', 'detect_dtypes']
+
+# Column types for the logger and aggregated files, stored as data; see load_schemas and get_dtypes
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Schemas.json')
+SCHEMA_TYPES = {'float': float, 'object': object, 'str': str} # Types in the schema file that are Python types; others ('Int64') are passed to pandas as they are
+schemas = {}
+ 
+# Text columns that are stored as categoricals in the compact schemas; the other object columns are the QC flags
+COMPACT_CATEGORIES = ['FP_Equation', 'FP_EQUATION', 'surface_type_text', 'poor_enrg_clsur']
+# Columns that keep their type in the compact schemas: RECORD and the values computed by Met_QAQC (derived, i.e. MSLP) which need float64 to be written out with the same digits
+COMPACT_KEEP = ['TIMESTAMP', 'RECORD'] + [c for var, rule in MET_QC_RULES.items() if rule.get('derived') for c in (var, f'{var}_Filtered')]
+
+def compact_dtypes(dtypes):
+    # Compact version of a schema from get_dtypes: float32 for the measurements, nullable booleans for the QC flags and categoricals for the text columns; about half the memory of the float64/object frames
+    # Logger values are single precision (IEEE4) to begin with so float32 holds them exactly and the csv is written with the same digits
+    compact = {}
+    for c, t in dtypes.items():
+        if c in COMPACT_KEEP:
+            compact[c] = t
+        elif c in COMPACT_CATEGORIES:
+            compact[c] = 'category'
+        elif t is float:
+            compact[c] = 'float32'
+        elif t is object:
+            compact[c] = 'boolean'
+        else:
+            compact[c] = t
+    return compact
+
+def compact_frame(df, dataset_type = None):
+    # Casts the columns of df to the compact types (see compact_dtypes); columns that are not in the schema of dataset_type are compacted by what they hold (float64 to float32, True/False to boolean)
+    schema = get_dtypes(dataset_type, compact=True) if dataset_type else {}
+    types = {}
+    for c in df.columns:
+        if c in schema:
+            if schema[c] in ('float32', 'boolean', 'category'): # Other types are left as read; e.g. the Int64 *_Flags columns hold the flag strings after Grade_cs
+                types[c] = schema[c]
+        elif c in COMPACT_KEEP:
+            continue
+        elif c in COMPACT_CATEGORIES:
+            types[c] = 'category'
+        elif df[c].dtype == np.float64:
+            types[c] = 'float32'
+        elif (df[c].dtype == bool) | (pd.api.types.infer_dtype(df[c], skipna=True) == 'boolean'):
+            types[c] = 'boolean'
+    flags = [c for c, t in types.items() if (t == 'boolean') & (df[c].dtype != 'boolean')]
+    if flags: # Flags can come in as text ('True'/'False', e.g. a parquet copy) or Python bools with NaN
+        df = df.assign(**{c: df[c].astype(str).map({'True': True, 'False': False}) for c in flags})
+    return df.astype(types)
+
+def load_schemas(schema_file = SCHEMA_FILE):
+    # Column types for each dataset type from the schema file ({table}Raw and {table}Aggregated, with _V{program signature} for the logger program version they are for)
+    # Read the first time it is needed and kept in schemas after that
+    if not schemas:
+        import json
+        with open(schema_file) as f:
+            for name, columns in json.load(f).items():
+                schemas[name] = {c: SCHEMA_TYPES.get(t, t) for c, t in columns.items()}
+    return schemas
+
+def get_dtypes(dataset_type, compact = False):
+    # Column types for read_csv for the dataset type; an empty dictionary (types inferred) when there is no schema for it
+    # compact: returns the compact version of the schema (see compact_dtypes)
+    dtypes = dict(load_schemas().get(dataset_type, {}))
+    if compact:
+        return compact_dtypes(dtypes)
+    return dtypes
+
+def detect_dataset_type(filename, col):
+    # Dataset type of a logger file from its TOA5 header line; {col}Raw_V{program signature} when there is a schema for that logger program, otherwise {col}Raw
+    import csv
+    with open(filename, newline='') as f:
+        header = next(csv.reader(f), [])
+    if (len(header) > 6) and (header[0] == 'TOA5'): # Header line: TOA5, station, logger model, serial number, OS version, program name, program signature, table name
+        versioned = f'{col}Raw_V{header[6]}'
+        if versioned in load_schemas():
+            return versioned
+    return f'{col}Raw'
+
+def detect_aggregated_type(aggregated_file, col):
+    # Dataset type of an aggregated file from the program version in its name ({Site}_{col}_AggregateQC_CY{YYYY}_V{program signature}_{YYYYMMDD}.csv); {col}Aggregated_V{program signature} when there is a schema for it, otherwise {col}Aggregated
+    # Reading with the same types as the logger files keeps columns such as the Int64 counts the same between the new and the previous data
+    for part in pathlib.Path(aggregated_file).stem.split('_'):
+        versioned = f"{col}Aggregated_{part.strip('*')}"
+        if versioned in load_schemas():
+            return versioned
+    return f'{col}Aggregated'
+
+def detect_dtypes(filename, col, compact = False):
+    # Column types for a logger file from the schema of its program version (see detect_dataset_type); passed as specified_dtypes so files from different program versions are read with their own types
+    return get_dtypes(detect_dataset_type(filename, col), compact)
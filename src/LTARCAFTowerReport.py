@@ -9,7 +9,6 @@ Updated: 2024-
 @author: Eddie Steiner
 """
 import os
-import pandas as pd
 # Change to directory that houses the the AzureDataLakeAccess library
 #os.chdir(r'C:\Users\russe\Documents\GitHub\AzureECTowerAccess')       
 import AzureDataLakeAccess as ADLA
@@ -29,6 +28,13 @@ DataTables = [flux, met]
 
 #*********************************************************************
 save = True # If want to save the aggregated file or not; default is True
+file_format = 'csv' # 'parquet' also saves a parquet copy of the aggregated files that is much faster to read back; csv is still saved and uploaded
+incremental = False # If True, only the new data (from the day of the first new record) is filled and QCed and added to the previous aggregated file; same result as re-processing the full water year
+use_manifest = False # If True, keeps a manifest of the datalake files in data/working so processed files are not downloaded again and runs with no new data stop early
+workers = 1 # Number of processes used to read the downloaded files; raise to the number of cores for catch-up runs after an outage
+compact = False # If True, holds the data in float32/boolean/categorical columns for about half the memory; the saved files are the same
+profile = False # If True, saves cProfile stats of the slowest stage of each run next to its metrics record (data/working/metrics); the stage times and counters are always recorded
+site_workers = 1 # Number of site/table jobs (e.g., CookEast Flux) run at the same time, each in its own process; 1 runs them one after the other. Each job also uses the workers above
 
 Sites = ['CookEast','CookWest'] # Name of the sites wanted; can be as many as want but must be within square brackets
 
@@ -50,40 +56,94 @@ workingPath.mkdir(parents=True, exist_ok=True)
 outputPath = cwd / 'data' / 'output'
 outputPath.mkdir(parents=True, exist_ok=True)
 
-#%% Download and aggregate the files from Azure blob storage
-for dataTable in DataTables:
-
+def run_job(site, dataTable, access):
+    # Downloads, aggregates, QCs and saves/uploads one table for one site; access is the site's settings from the config (ADLA.load_config)
+    # Returns the number of rows written to the aggregated file by this run (None if there was no new data); with incremental only the re-processed rows added to the previous file are written
     col = dataTable['col']
     Time = dataTable['Time']
 
-    for k in range (0,len(Sites)):
-        # Different file structure and output locations for the different sites
-        access = pd.read_excel(configPath, sheet_name =Sites[k],index_col = 'Variable').to_dict()
-
-        # Add path information to access
-        access[col]["inputPath"] = str(inputPath)
-        access[col]["workingPath"] = str(workingPath)
-        access[col]["outputPath"] = str(outputPath)
-
-        # Directory should be where the base file starts. There needs to be some start file even if it is blank with the date of the start point; 
-        # I haven't sorted out a "first" pass without a start file to be used. 
-        colT = col + '_' + access[col]['Ver']
-        #CEF = 'C:\\Users\\russe\\Desktop\\LTAR\\Problems\\Temp\\Aggregate\\'+Sites[k]+'*_'+colT+'*.csv' 
-        #globString = Sites[k]+'*_'+colT+'*.csv'
-
-        # {Site}\{Site}_{Met/Flux}_AggregateQC_CY{YYYY}_V{ProgramSignature}_{YYYYMMDD}.csv
-        globString = Sites[k] + '_' + col + '_AggregateQC_CY*' + '_' + access[col]['Ver'] + '*.csv'
-        #globString = Sites[k] + "\\" + Sites[k] + '_' + col + '_AggregateQC_CY*' + '_' + access[col]['Ver'] + '*.csv'
-        CEF = str(outputPath / Sites[k] / col / globString)
-
-        # Calls the function that access the Azure data lake using the options given in the first section. 
-        # Can add the save and date options if want them to be different than the default
-        
-        df = ADLA.AccessAzure(Sites[k], col, Time, access, CEF, QC=False)
-        
-
-    if col =='Flux':
-        TRP.TowerReport(str(outputPath))
-#    if col == 'Met':
-#        TRP.MetTowerReport(str(outputPath))
+    # Add path information to access
+    access[col]["inputPath"] = str(inputPath)
+    access[col]["workingPath"] = str(workingPath)
+    access[col]["outputPath"] = str(outputPath)
+
+    # Directory should be where the base file starts. There needs to be some start file even if it is blank with the date of the start point; 
+    # I haven't sorted out a "first" pass without a start file to be used. 
+    colT = col + '_' + access[col]['Ver']
+    #CEF = 'C:\\Users\\russe\\Desktop\\LTAR\\Problems\\Temp\\Aggregate\\'+Sites[k]+'*_'+colT+'*.csv' 
+    #globString = Sites[k]+'*_'+colT+'*.csv'
+
+    # {Site}\{Site}_{Met/Flux}_AggregateQC_CY{YYYY}_V{ProgramSignature}_{YYYYMMDD}.csv
+    globString = site + '_' + col + '_AggregateQC_CY*' + '_' + access[col]['Ver'] + '*.csv'
+    #globString = Sites[k] + "\\" + Sites[k] + '_' + col + '_AggregateQC_CY*' + '_' + access[col]['Ver'] + '*.csv'
+    CEF = str(outputPath / site / col / globString)
+
+    # Calls the function that access the Azure data lake using the options given in the first section. 
+    # Can add the save and date options if want them to be different than the default
+
+    metrics = ADLA.RunMetrics(site, col, profile)
+    df = ADLA.AccessAzure(site, col, Time, access, CEF, QC=False, workers=workers, file_format=file_format, incremental=incremental,
+        manifest=(workingPath / 'DatalakeManifest.sqlite') if use_manifest else None, compact=compact, metrics=metrics)
+    return None if df is None else metrics.counters.get('rows_written', 0)
+
+def run_jobs(Sites, DataTables, site_workers=1):
+    # Runs run_job for each site and table; site_workers > 1 runs that many jobs at the same time in a process pool, 1 runs them here one after the other in the order of DataTables
+    # The tower report is made as soon as all the Flux jobs are done (the Met jobs can still be running), if at least one of them succeeded. A failed job, or report, does not stop the others
+    # Returns the result (rows written) and the error of each job keyed by (site, col); the report is under report_job
+    from concurrent.futures import ProcessPoolExecutor, wait
+    # Different file structure and output locations for the different sites; the workbook is only parsed when it has changed since the last run
+    config = ADLA.load_config(configPath)
+    missing = [site for site in Sites if site not in config]
+    if missing:
+        raise Exception(f'No sheet for {", ".join(missing)} in {configPath}')
+    results = {}
+    errors = {}
+    report_job = ('TowerReport', 'Flux')
+
+    def collect(job, get):
+        # Stores the result of the job, or its error if it failed
+        try:
+            results[job] = get()
+        except Exception as e:
+            print(f'{job[0]} {job[1]} failed: {e!r}')
+            errors[job] = e
+
+    def flux_done():
+        # Tower report from the aggregated Flux files; made if any Flux job succeeded, and recorded like a job so a failure (e.g., report drive not there) is only printed
+        if any((job[1] == 'Flux') & (job != report_job) for job in results):
+            collect(report_job, lambda: TRP.TowerReport(str(outputPath), compact=compact))
+
+    if site_workers > 1:
+        with ProcessPoolExecutor(max_workers=site_workers) as pool:
+            futures = {(site, dataTable['col']): pool.submit(run_job, site, dataTable, config[site]) for dataTable in DataTables for site in Sites}
+            flux = {job: f for job, f in futures.items() if job[1] == 'Flux'}
+            if flux:
+                wait(flux.values())
+                for job, future in flux.items():
+                    collect(job, future.result)
+                flux_done()
+            for job, future in futures.items():
+                if job not in flux:
+                    collect(job, future.result)
+    else:
+        for dataTable in DataTables:
+            for site in Sites:
+                collect((site, dataTable['col']), lambda: run_job(site, dataTable, config[site]))
+            if dataTable['col'] == 'Flux':
+                flux_done()
+        #    if col == 'Met':
+        #        TRP.MetTowerReport(str(outputPath))
+
+    for job in results:
+        if job == report_job:
+            print('Tower report done')
+            continue
+        print(f'{job[0]} {job[1]}: {"no new data" if results[job] is None else str(results[job]) + " rows written"}')
+    if errors:
+        print('Failed: ' + ', '.join(f'{site} {col}' for site, col in errors))
+    return results, errors
 
+#%% Download and aggregate the files from Azure blob storage
+# Guard needed so worker processes (workers > 1, site_workers > 1) do not rerun the driver when they import it
+if __name__ == '__main__':
+    results, errors = run_jobs(Sites, DataTables, site_workers)
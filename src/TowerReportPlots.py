@@ -9,18 +9,112 @@ Created on Thu Jul  9 15:55:41 2020
 import glob
 import os
 import pathlib
-import matplotlib.pyplot as plt
 import datetime
 import numpy as np
-from matplotlib.backends.backend_pdf import PdfPages
-import AzureDataLakeAccess as ADLA
+import pandas as pd
+import DataLakeIO as IO # Only the file reading part of the library is needed; matplotlib is imported when a report is written
 
-def TowerReport(pathToAggregatedFiles, startdate=None, enddate=None):
+# Variables plotted for each group in the tower report; only these columns are read from the aggregated files
+#UPDATE THESE WITH NEW VARIABLES **********************************************************************
+
+variable_groups = {
+    "Heat and Energy Fluxes": ['H', 'LE', 'FC_mass'],
+    "Temperature Variables": ['TA_1_1_1', 'TA_1_1_2', 'T_SONIC'],
+    "Humidity and Precipitation": ['RH_1_1_1', 'RH_1_1_3', 'P'],
+    "Wind and Friction": ['USTAR', 'FETCH_90'],
+    "Radiation and Photosynthetically Active Radiation": ['PPFD_IN'],
+    "Wind Components": ['Ux', 'Uy', 'Uz'],
+    "Flux Sample Totals": ['FC_samples', 'LE_samples', 'H_samples'],
+    "Signal Strengths": ['CO2_sig_strgth_Min', 'H2O_sig_strgth_Min'],
+    "Soil Temperature and Water Content (Shallow)": ['TS_TDR31X_1_1_1']
+}
+
+#***************************************************************************************************
+
+def minmax_downsample(times, values, buckets):
+    # Downsamples a series for plotting to the smallest and largest value of each of buckets equal pieces, kept in time order, so spikes still show at any window length
+    # Pieces with no data keep one blank (NaN) point so the line still breaks over the gap; series with no more than 2*buckets points are returned as they are
+    n = len(values)
+    if n <= 2*buckets:
+        return times, values
+    size = -(-n // buckets) # Points per piece, rounded up
+    buckets = -(-n // size) # So only the last piece is padded and it still has a point of the series
+    v = np.concatenate([values, np.full(size*buckets - n, np.nan)]).reshape(buckets, size)
+    lo = np.where(np.isnan(v), np.inf, v).argmin(1) # Pieces with no data give their first (blank) point
+    hi = np.where(np.isnan(v), -np.inf, v).argmax(1)
+    start = np.arange(buckets)*size
+    idx = np.column_stack([start + np.minimum(lo, hi), start + np.maximum(lo, hi)]).ravel()
+    keep = np.ones(len(idx), dtype=bool)
+    keep[1::2] = lo != hi # Only one point when the smallest and largest are the same point
+    idx = idx[keep]
+    return times[idx], values[idx]
+
+def plot_page(category_label, vars_to_plot, series, max_points=2000):
+    # Builds the report page for one variable group; series holds the (times, values) arrays of each station for each variable, max_points is the most points plotted per line
+    # Uses a Figure object rather than pyplot so nothing is kept in pyplot's global state between pages
+    # Returns the figure (None if nothing was plotted) and the variables with no data
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(8, 8))
+    fig.suptitle(category_label, fontsize=14, fontweight='bold') # Add category label as a title
+    figure_plotted = False # Track if any data is plotted for this figure
+    invalid_vars = []
+    for idx, var in enumerate(vars_to_plot, 1):
+        ax = fig.add_subplot(len(vars_to_plot), 1, idx)
+        for station, (times, values) in series[var].items():
+            ax.plot(*minmax_downsample(times, values, max_points//2), label=station)
+        if series[var]:
+            ax.legend(fontsize=8)
+            figure_plotted = True
+        else:
+            print(f"Warning: No data plotted for {var} in any station.")
+            invalid_vars.append(var)
+        ax.set_ylabel(f'{var}', fontsize=12)
+        for label in ax.get_xticklabels(): # Rotate x-axis labels for clarity
+            label.set_rotation(45)
+            label.set_horizontalalignment('right')
+    if not figure_plotted:
+        return None, invalid_vars
+    fig.tight_layout(rect=[0, 0.03, 1, 0.95]) # Adjust layout to fit title
+    return fig, invalid_vars
+
+def write_report(path_to_file, data_frames, max_points=2000):
+    # Writes a page for each variable group to the pdf at path_to_file from the data of each station; returns the variables with no data
+    from matplotlib.backends.backend_pdf import PdfPages
+    invalid_vars = []
+    pdf_pages = PdfPages(path_to_file)
+
+    # Plotting for each variable group
+    for category_label, vars_to_plot in variable_groups.items():
+        series = {}
+        for var in vars_to_plot:
+            series[var] = {}
+            for station in data_frames:
+                if var in data_frames[station].columns:
+                    if not data_frames[station][var].empty:
+                        series[var][station] = (data_frames[station].index.to_numpy(), data_frames[station][var].astype(float).to_numpy())
+                    else:
+                        print(f"Warning: {var} for {station} is empty.")
+                else:
+                    print(f"Warning: {var} not found in {station}.")
+        fig, page_invalid_vars = plot_page(category_label, vars_to_plot, series, max_points)
+        invalid_vars += page_invalid_vars
+        if fig is not None: # Save the figure only if at least one variable was plotted
+            pdf_pages.savefig(fig)
+
+    pdf_pages.close()
+    return invalid_vars
+
+def TowerReport(pathToAggregatedFiles, startdate=None, enddate=None, compact=False, days=10, max_points=2000):
+    # compact: reads the aggregated files into the compact types (see DataLakeSchemas.compact_dtypes) for about half the memory
+    # days: length of the plotted window ending at the last data; lines with more than max_points points are downsampled (minmax_downsample) so long windows cost about the same as short ones
     #stations = ['CookEast', 'CookWest', 'BoydNorth', 'BoydSouth']
     stations = ['CookEast', 'CookWest']
+    columns = [var for vars_to_plot in variable_groups.values() for var in vars_to_plot]
+
     data_frames = {}
     missing_stations = []
     invalid_vars = []
+    read_end = None # End of the rows read; set from the first station read as the plotted window is taken from it below
     
     # Reading data for each station
     for station in stations:
@@ -28,10 +122,16 @@ def TowerReport(pathToAggregatedFiles, startdate=None, enddate=None):
         filenames = glob.glob(f"{pathToAggregatedFiles}\\{station}\\Flux\\{station}*Flux*.csv")
         
         try:
-            data = ADLA.Fast_Read([ADLA.get_latest_file(filenames)], 1, '30min')
+            aggregated_file = IO.get_latest_file(filenames)
+            end = read_end if read_end is not None else IO.get_last_timestamp(aggregated_file)
+            if enddate is not None:
+                end = min(end, pd.Timestamp(enddate))
+            # Only the plotted columns and days (plus a day to cover the enddate filter below) are read
+            data = IO.read_aggregated(aggregated_file, 'Flux', '30min', compact, columns, end - datetime.timedelta(days=days+1), end)
             if data.empty:
                 raise ValueError(f"No data found for {station}")
             data_frames[station] = data
+            read_end = end
         except Exception as e:
             print(f"Error reading data for {station}: {e}")
             missing_stations.append(station)
@@ -55,7 +155,7 @@ def TowerReport(pathToAggregatedFiles, startdate=None, enddate=None):
     
     # Assuming at least one valid dataset is present
     valid_station = next(iter(data_frames))
-    s = data_frames[valid_station].index[-1] - datetime.timedelta(days=+10)
+    s = data_frames[valid_station].index[-1] - datetime.timedelta(days=days)
     e = data_frames[valid_station].index[-1]
     
     for station in data_frames:
@@ -66,63 +166,8 @@ def TowerReport(pathToAggregatedFiles, startdate=None, enddate=None):
     
     path_to_drive = pathlib.Path('G:\Shared drives\CafMeteorologyECTower\Documents\TowerReports')
     path_to_file = path_to_drive / f'CAFLTARTowerReport{s}_{e}.pdf'
-    pdf_pages = PdfPages(str(path_to_file))
     
-    # Plotting for each variable group
-
-    #UPDATE THESE WITH NEW VARIABLES **********************************************************************
-   
-    variable_groups = {
-        "Heat and Energy Fluxes": ['H', 'LE', 'FC_mass'],
-        "Temperature Variables": ['TA_1_1_1', 'TA_1_1_2', 'T_SONIC'],
-        "Humidity and Precipitation": ['RH_1_1_1', 'RH_1_1_3', 'P'],
-        "Wind and Friction": ['USTAR', 'FETCH_90'],
-        "Radiation and Photosynthetically Active Radiation": ['PPFD_IN'],
-        "Wind Components": ['Ux', 'Uy', 'Uz'],
-        "Flux Sample Totals": ['FC_samples', 'LE_samples', 'H_samples'],
-        "Signal Strengths": ['CO2_sig_strgth_Min', 'H2O_sig_strgth_Min'],
-        "Soil Temperature and Water Content (Shallow)": ['TS_TDR31X_1_1_1']
-    }
-
-    #***************************************************************************************************
-
-    for category_label, vars_to_plot in variable_groups.items():
-        fig = plt.figure(figsize=(8, 8)) 
-        figure_plotted = False  # Track if any data is plotted for this figure
-        
-        # Add category label as a title
-        fig.suptitle(category_label, fontsize=14, fontweight='bold')
-
-        for idx, var in enumerate(vars_to_plot, 1):
-            ax = plt.subplot(len(vars_to_plot), 1, idx)
-            plotted = False  # Track if any data is plotted for this variable
-            
-            for station in data_frames:
-                if var in data_frames[station].columns:
-                    if not data_frames[station][var].empty:
-                        plt.plot(data_frames[station][var].astype(float), label=station)
-                        plotted = True
-                        figure_plotted = True  # Mark figure as having plotted data
-                    else:
-                        print(f"Warning: {var} for {station} is empty.")
-                else:
-                    print(f"Warning: {var} not found in {station}.")
-            
-            if plotted:
-                plt.legend(fontsize=8)
-            else:
-                print(f"Warning: No data plotted for {var} in any station.")
-                invalid_vars.append(var)
-            
-            plt.ylabel(f'{var}', fontsize=12)
-            plt.xticks(rotation=45, ha='right')  # Rotate x-axis labels for clarity
-
-        if figure_plotted:  # Save the figure only if at least one variable was plotted
-            plt.tight_layout(rect=[0, 0.03, 1, 0.95])  # Adjust layout to fit title
-            pdf_pages.savefig(fig)
-        else:
-            plt.close(fig)  # Close the figure without saving if no data was plotted
+    invalid_vars += write_report(str(path_to_file), data_frames, max_points)
 
     print("Variables not found or empty: ", invalid_vars)
 
-    pdf_pages.close()